@@ -1,9 +1,18 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import glob
+import json
 # import logging
 import os
 import platform
+import re
+import shutil
+import struct
+import tempfile
 import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ElementTree
 
 from colorama import deinit, Fore, init
 import ffmpeg
@@ -28,6 +37,34 @@ IN_PLACE_TRANSCODING = False
 #   and a report is generated with info on which files require transcoding and why
 DISCOVERY_MODE = False
 
+# None: walk the input directory and act on files as normal
+# path: run in 'plan mode', where the decisions for each file are saved to this file
+#   as an execution plan instead of being acted upon
+PLAN_FILE = None
+# None: walk the input directory and act on files as normal
+# path: execute the plan saved at this path, without walking or re-probing unchanged files
+APPLY_FILE = None
+
+# None: don't keep track of transcoded files between runs
+# path: record each transcoded input's output and settings in this file, so later runs (when not
+#   transcoding in place) skip inputs whose output is still up to date instead of transcoding them again
+MANIFEST_FILE = './transcode_manifest.json'
+
+# None: don't tell Plex about changes
+# URL: base URL of the Plex server (e.g. 'http://localhost:32400'), which is asked to scan
+#   only the directories whose contents changed during the run
+PLEX_URL = None
+# X-Plex-Token used to authenticate with the Plex server
+PLEX_TOKEN = None
+# None: find the library section of each changed directory from its locations
+# id: library section to scan changed directories in
+PLEX_LIBRARY_SECTION = None
+# local path prefixes mapped to the prefixes the Plex server sees them at,
+#   e.g. {'/mnt/nas/media': '/data/media'}
+PLEX_PATH_MAP = {}
+# seconds to collect changed directories for before scanning them during a long run
+PLEX_SCAN_DEBOUNCE_SECONDS = 300
+
 # directory to read from, defaulting to current directory
 INPUT_DIRECTORY = "./input"
 # directory where files will go if not transcoding in place
@@ -44,13 +81,119 @@ ALLOWED_OUTPUT_AUDIO_CODECS = ['aac']
 OUTPUT_FILE_TYPE = 'mp4'
 # file types that don't require transcoding if codec requirements are satisfied
 ALLOWED_OUTPUT_FILE_TYPES = ['mp4', 'm4v', 'mkv']
+# bitrate ceilings which video must fit within to direct play to remote clients;
+#   max_video_bitrate and video_buffer_size are in kbit/s, max_height (optional) in pixels
+BITRATE_PROFILES = {
+    'remote-8mbit': {'max_video_bitrate': 6500, 'video_buffer_size': 13000, 'max_height': 1080},
+    'remote-4mbit': {'max_video_bitrate': 3200, 'video_buffer_size': 6400, 'max_height': 720},
+    'remote-2mbit': {'max_video_bitrate': 1500, 'video_buffer_size': 3000, 'max_height': 480}
+}
+# None: don't limit video bitrate
+# profile name: transcode video which exceeds the ceilings of this profile in BITRATE_PROFILES
+BITRATE_PROFILE = None
+# quality of video encoded under a bitrate ceiling; the ceiling wins where they conflict
+CAPPED_CRF = 23
+# False: encode video with a fixed quality
+# True: before encoding a file's video, encode a few sampled clips at each CRF in CRF_SEARCH_VALUES,
+#   score them against the source, and use the highest CRF meeting CRF_SEARCH_QUALITY_FLOOR
+CRF_SEARCH = False
+# CRF values to try, from highest quality (lowest CRF) to lowest quality
+CRF_SEARCH_VALUES = [18, 20, 22, 24, 26, 28]
+# ffmpeg filter used to score sampled clips against the source: 'ssim' or 'psnr'
+CRF_SEARCH_METRIC = 'ssim'
+# lowest acceptable score for every sampled clip (SSIM from 0 to 1, or PSNR in dB, e.g. 40)
+CRF_SEARCH_QUALITY_FLOOR = 0.98
+# number and length in seconds of clips sampled from each file
+CRF_SEARCH_SAMPLE_COUNT = 3
+CRF_SEARCH_SAMPLE_SECONDS = 4
+# number of sampled clips encoded and scored at the same time
+CRF_SEARCH_WORKERS = 4
+# file where search results are cached, so each file is only searched once
+CRF_SEARCH_CACHE_FILE = './crf_search_cache.json'
+# False: don't generate seek preview thumbnails
+# True: also save seek preview thumbnails in a BIF index next to each output, for players and servers
+#   which read sidecar BIFs (e.g. Roku, Emby); decoded in the same pass as the transcode (or, when video
+#   is copied, extracted from keyframes only). Plex doesn't read sidecar BIFs, and still generates its own
+GENERATE_THUMBNAILS = False
+# seconds between seek preview thumbnails
+THUMBNAIL_INTERVAL = 10
+# width in pixels of seek preview thumbnails
+THUMBNAIL_WIDTH = 320
+# lower resolution 'optimized versions' which can be made alongside each transcoded file;
+#   height in pixels, max_video_bitrate in kbit/s, suffix added to the output file name
+RENDITION_SPECS = {
+    '720p': {'height': 720, 'max_video_bitrate': 4000, 'suffix': '-720p'},
+    '480p': {'height': 480, 'max_video_bitrate': 1500, 'suffix': '-480p'}
+}
+# names of renditions in RENDITION_SPECS to make, from the same decode as the transcode;
+#   renditions at or above a file's own resolution are skipped
+RENDITIONS = []
+# False: leave audio channels as they are
+# True: for files without a stereo track in an allowed audio codec, keep the surround track and add
+#   a downmixed stereo track as the default audio, so browsers can direct play it
+ADD_STEREO_AUDIO = False
+# surround audio codecs which are copied as-is alongside an added stereo track
+STEREO_SURROUND_COPY_CODECS = ['aac', 'ac3', 'eac3']
+# False: leave subtitles embedded in files
+# True: extract text subtitles to .srt files next to each output, named so Plex picks them up,
+#   so Plex doesn't have to burn them in with a full video transcode
+EXTRACT_SUBTITLES = False
+# subtitle codecs which are text, and can be converted to .srt
+TEXT_SUBTITLE_CODECS = ['subrip', 'srt', 'ass', 'ssa', 'mov_text', 'webvtt', 'text']
+# subtitle codecs which are images, and can't be converted to .srt
+IMAGE_SUBTITLE_CODECS = ['hdmv_pgs_subtitle', 'dvd_subtitle', 'dvb_subtitle', 'xsub']
 # filetypes to automatically skip; this could get really long, but these are the main ones for me
-EXCLUDED_FILE_TYPES = ['py', 'gitignore', 'txt', 'zip', 'rar', 'exe', 'srt', 'sub', 'jpg', 'jpeg', 'png', 'webp', 'idx', 'lnk']
+EXCLUDED_FILE_TYPES = ['py', 'gitignore', 'txt', 'zip', 'rar', 'exe', 'srt', 'sub', 'jpg', 'jpeg', 'png', 'webp', 'idx', 'lnk', 'bif']
+
+# False: trust ffmpeg's exit code once transcoding finishes
+# True: probe each output and decode a few sampled windows before accepting it
+#   (and, if transcoding in place, before deleting the original file)
+VERIFY_OUTPUT = True
+# number of windows, spread across the file, decoded when verifying an output
+VERIFY_SAMPLE_COUNT = 3
+# length in seconds of each decoded verification window
+VERIFY_SAMPLE_SECONDS = 2
+# allowed difference in seconds between input and output durations
+VERIFY_DURATION_TOLERANCE = 2.0
+
+# rough speeds, as multiples of realtime, used to estimate the cost of planned files
+ESTIMATED_ENCODE_SPEED = 1.0
+ESTIMATED_REMUX_SPEED = 50.0
+# probed stream details that are kept in a plan, so applying it needs no re-probing
+PLAN_PROBE_STREAM_KEYS = ['index', 'codec_type', 'codec_name', 'channels', 'bit_rate', 'width', 'height', 'disposition', 'tags']
 
 # log level for ffmpeg, which does the transcoding
 FFMPEG_LOG_LEVEL = 'error'
+# command used to run ffprobe, which finds the codecs of files
+FFPROBE_COMMAND = 'ffprobe'
+# None: probe files by running FFPROBE_COMMAND
+# function: probe files by calling this with a file's path instead, returning a result
+#   shaped like ffprobe's JSON output (used to simulate large libraries)
+PROBE_BACKEND = None
 
 discovery_mode_list = []
+image_subtitle_list = []
+plan_file_list = []
+# output paths taken by planned files, which other files' outputs avoid even though nothing exists there yet
+reserved_output_files = set()
+# seconds spent on each optional stage of the run, reported at the end
+run_timings = {
+    'verification': 0.0,
+    'crf_search': 0.0
+}
+# decodes saved by making renditions in the same pass as the transcode, reported at the end
+rendition_stats = {
+    'decodes_saved': 0,
+    'video_seconds_saved': 0.0
+}
+# directories changed since Plex was last asked to scan, and when the first was changed
+plex_scan_queue = {
+    'directories': set(),
+    'queued_time': None
+}
+plex_library_sections = None
+crf_search_cache = None
+manifest = None
 
 
 def output_banner():
@@ -137,10 +280,57 @@ def seconds_to_string(time_seconds):
     return output_text if output_text != "" else "0 seconds"
 
 
-def get_current_codecs(input_path):
+def probe_file(input_path):
+    """Probe a file with ffprobe
+
+    Run ffprobe (or PROBE_BACKEND, if set) on the file at the given path
+    and return its result. If the file is not a format which can be probed,
+    return None.
+
+    Parameters
+    ----------
+    input_path : string
+        full path of the input file, including file name and type
+
+    Returns
+    -------
+    dict
+        ffprobe's description of the file's format and streams, or None
+    """
+
+    try:
+        if PROBE_BACKEND:
+            return PROBE_BACKEND(input_path)
+        return ffmpeg.probe(input_path, cmd=FFPROBE_COMMAND)
+    except (Exception):
+        return None
+
+
+def read_json_file(json_path):
+    """Read a JSON file which is kept between runs
+
+    Parameters
+    ----------
+    json_path : string
+        path of the JSON file
+
+    Returns
+    -------
+    dict
+        the file's contents, or an empty dict if it doesn't exist or isn't valid JSON
+    """
+
+    try:
+        with open(json_path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_current_codecs(probe_result):
     """Find the current video and audio codec of a file
 
-    Determine what video and audio codecs the file at the given path
+    Determine what video and audio codecs the probed file
     is using. If the file has more than one audio or video stream,
     it will return the codec of the first. If it is missing either,
     or is not a file format which can be probed this way,
@@ -148,35 +338,360 @@ def get_current_codecs(input_path):
 
     Parameters
     ----------
-    input_path : string
-        full path of the input file, including file name and type
+    probe_result : dict
+        result of probe_file for the file, or None if probing failed
 
     Returns
     -------
     string
-        a string describing the video codec of the file at the given path
+        a string describing the video codec of the probed file
     string
-        a string describing the audio codec of the file at the given path
+        a string describing the audio codec of the probed file
+    """
+
+    if not probe_result:
+        return None, None
+
+    video_codec = None
+    audio_codec = None
+    for stream in probe_result.get('streams', []):
+        if not video_codec and stream.get('codec_type') == 'video':
+            video_codec = stream.get('codec_name')
+        if not audio_codec and stream.get('codec_type') == 'audio':
+            audio_codec = stream.get('codec_name')
+        if video_codec and audio_codec:
+            break
+    return video_codec, audio_codec
+
+
+def get_duration(probe_result):
+    """Get the duration of a probed file
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file, or None if probing failed
+
+    Returns
+    -------
+    float
+        duration of the file in seconds, or None if it is unknown
     """
 
     try:
-        probe_result = ffmpeg.probe(input_path)
-        video_codec = None
-        audio_codec = None
-        for stream in probe_result['streams']:
-            if not video_codec and stream['codec_type'] == 'video':
-                video_codec = stream['codec_name']
-            if not audio_codec and stream['codec_type'] == 'audio':
-                audio_codec = stream['codec_name']
-                # print()
-                # print('--- CHANNELS ---')
-                # print(stream['channels'])
-                # print()
-            if video_codec and audio_codec:
-                break
-        return video_codec, audio_codec
+        return float(probe_result['format']['duration'])
     except (Exception):
-        return None, None
+        return None
+
+
+def get_stream_counts(probe_result):
+    """Count the streams of each type in a probed file
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file, or None if probing failed
+
+    Returns
+    -------
+    dict
+        number of streams keyed by codec type, e.g. {'video': 1, 'audio': 2}
+    """
+
+    stream_counts = {}
+    if not probe_result:
+        return stream_counts
+    for stream in probe_result.get('streams', []):
+        codec_type = stream.get('codec_type')
+        stream_counts[codec_type] = stream_counts.get(codec_type, 0) + 1
+    return stream_counts
+
+
+def get_video_stream(probe_result):
+    """Get the first video stream of a probed file
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file, or None if probing failed
+
+    Returns
+    -------
+    dict
+        ffprobe's description of the stream, or None if there is no video stream
+    """
+
+    if not probe_result:
+        return None
+    for stream in probe_result.get('streams', []):
+        if stream.get('codec_type') == 'video':
+            return stream
+    return None
+
+
+def get_stream_bitrate(stream):
+    """Get the bitrate of a probed stream
+
+    Use the bitrate ffprobe reports for the stream, falling back to
+    the bitrate statistics tag written by mkvmerge.
+
+    Parameters
+    ----------
+    stream : dict
+        ffprobe's description of the stream
+
+    Returns
+    -------
+    int
+        bitrate in bit/s, or None if it is unknown
+    """
+
+    tags = stream.get('tags', {})
+    for bitrate in [stream.get('bit_rate'), tags.get('BPS'), tags.get('BPS-eng')]:
+        try:
+            return int(bitrate)
+        except (Exception):
+            continue
+    return None
+
+
+def get_video_bitrate(probe_result):
+    """Get the video bitrate of a probed file
+
+    Use the bitrate of the first video stream if it's known. Otherwise,
+    use the bitrate of the whole file minus the bitrates of its audio
+    streams, if all of those are known.
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file, or None if probing failed
+
+    Returns
+    -------
+    int
+        video bitrate in kbit/s, or None if it is unknown
+    """
+
+    video_stream = get_video_stream(probe_result)
+    if not video_stream:
+        return None
+    video_bitrate = get_stream_bitrate(video_stream)
+    if video_bitrate is not None:
+        return video_bitrate // 1000
+
+    try:
+        file_bitrate = int(probe_result['format']['bit_rate'])
+    except (Exception):
+        return None
+    audio_bitrates = [
+        get_stream_bitrate(stream)
+        for stream in probe_result.get('streams', [])
+        if stream.get('codec_type') == 'audio'
+    ]
+    # the file's bitrate includes its audio, which can be large (e.g. lossless tracks)
+    if None in audio_bitrates:
+        return None
+    return max(file_bitrate - sum(audio_bitrates), 0) // 1000
+
+
+def get_bitrate_ceiling_issues(file_info):
+    """Find the ways a file exceeds the selected bitrate profile
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+
+    Returns
+    -------
+    list
+        strings describing each exceeded ceiling, e.g. ['40000 kbit/s video'],
+        empty if no profile is selected or the file is within its ceilings
+    """
+
+    if not BITRATE_PROFILE:
+        return []
+    profile = BITRATE_PROFILES[BITRATE_PROFILE]
+
+    issues = []
+    video_bitrate = get_video_bitrate(file_info['probe_result'])
+    if video_bitrate and video_bitrate > profile['max_video_bitrate']:
+        issues.append(f'{video_bitrate} kbit/s video')
+    video_height = (get_video_stream(file_info['probe_result']) or {}).get('height')
+    if profile.get('max_height') and video_height and video_height > profile['max_height']:
+        issues.append(f'{video_height}p video')
+    return issues
+
+
+def lacks_stereo_track(probe_result):
+    """Check if a probed file's surround audio is missing a stereo-compatible track
+
+    Files whose first audio stream is already mono or stereo don't need
+    an extra track: the normal transcode converts it to an allowed codec.
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file
+
+    Returns
+    -------
+    bool
+        True if the file's first audio stream has more than two channels,
+        and none of its audio streams use an allowed audio codec
+        with two or fewer channels
+    """
+
+    audio_streams = [stream for stream in probe_result.get('streams', []) if stream.get('codec_type') == 'audio']
+    if not audio_streams or audio_streams[0].get('channels', 0) <= 2:
+        return False
+    for stream in audio_streams:
+        if stream.get('codec_name') in ALLOWED_OUTPUT_AUDIO_CODECS and stream.get('channels', 0) <= 2:
+            return False
+    return True
+
+
+def get_subtitle_streams(probe_result, subtitle_codecs):
+    """Get the subtitle streams of a probed file which use the given codecs
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file
+    subtitle_codecs : list
+        codecs of the subtitle streams to get
+
+    Returns
+    -------
+    list
+        tuples of each matching stream's position among the file's subtitle streams
+        (as used in the stream specifier 's:<position>') and ffprobe's description of it
+    """
+
+    subtitle_streams = [stream for stream in probe_result.get('streams', []) if stream.get('codec_type') == 'subtitle']
+    return [
+        (position, stream)
+        for position, stream in enumerate(subtitle_streams)
+        if stream.get('codec_name') in subtitle_codecs
+    ]
+
+
+def get_output_file_base(file_info):
+    """Get the path a file's output is saved with, excluding file type
+
+    Sidecar files are named after this path. When transcoding in place, the
+    output takes the input's name. Otherwise, if the manifest records an earlier
+    output in the output directory with the output file type, the new output
+    replaces it (see replace_stale_output); if not, it's saved to the path
+    get_output_file picks.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        directory_path: path of the input file, excluding file name and type
+        file_name: name of the input file, excluding file type
+        input_path: full path of the input file, including file name and type
+
+    Returns
+    -------
+    string
+        path of the output file, excluding file type, e.g. 'path/to/file'
+    """
+
+    if IN_PLACE_TRANSCODING:
+        return f"{file_info['directory_path']}/{file_info['file_name']}"
+
+    manifest_entry = get_manifest_entry(file_info['input_path'])
+    if manifest_entry:
+        stale_file = manifest_entry['output_path']
+        if os.path.isfile(stale_file) and is_in_output_directory(stale_file) and stale_file.endswith(f'.{OUTPUT_FILE_TYPE}'):
+            return os.path.splitext(stale_file)[0]
+    return os.path.splitext(get_output_file(file_info['directory_path'], file_info['file_name']))[0]
+
+
+def get_text_subtitles(file_info):
+    """Get the text subtitles of a file which should be extracted to sidecars
+
+    Each subtitle gets a name suffix in the form Plex expects for sidecar
+    subtitles, i.e. '.<language>', followed by '.forced' or '.sdh' if applicable.
+    Subtitles whose sidecar already exists next to where the output
+    will be saved (see get_output_file_base) are left out.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        directory_path: path of the input file, excluding file name and type
+        file_name: name of the input file, excluding file type
+        input_path: full path of the input file, including file name and type
+        probe_result: result of probe_file for the input file
+
+    Returns
+    -------
+    list
+        dicts with keys:
+        position: the stream's position among the file's subtitle streams
+        suffix: suffix of the sidecar name, e.g. '.eng.forced'
+    """
+
+    output_file_base = get_output_file_base(file_info)
+    text_subtitles = []
+    used_suffixes = set()
+    for position, stream in get_subtitle_streams(file_info['probe_result'], TEXT_SUBTITLE_CODECS):
+        suffix = f".{stream.get('tags', {}).get('language', 'und')}"
+        disposition = stream.get('disposition', {})
+        if disposition.get('forced'):
+            suffix += '.forced'
+        elif disposition.get('hearing_impaired'):
+            suffix += '.sdh'
+        # more than one subtitle with the same language gets numbered, e.g. '.2.eng'
+        unique_suffix = suffix
+        counter = 2
+        while unique_suffix in used_suffixes:
+            unique_suffix = f'.{counter}{suffix}'
+            counter += 1
+        used_suffixes.add(unique_suffix)
+
+        if not os.path.isfile(f"{output_file_base}{unique_suffix}.srt"):
+            text_subtitles.append({'position': position, 'suffix': unique_suffix})
+    return text_subtitles
+
+
+def get_kept_subtitles(file_info):
+    """Get the subtitles of a file which are kept in its output
+
+    Subtitles are kept if the output file type can hold them: mp4-style
+    outputs hold text subtitles, converted to mov_text; mkv outputs hold text
+    subtitles (mov_text is converted to .srt) and image subtitles, copied as-is.
+    When subtitle extraction is on, text subtitles are never kept, even if
+    their sidecars already exist, as they belong in the sidecars.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+
+    Returns
+    -------
+    list
+        tuples of each kept stream's position among the file's subtitle streams
+        and the subtitle codec option it's kept with
+    """
+
+    # text subtitles go to sidecars instead of the output
+    text_subtitle_codecs = [] if EXTRACT_SUBTITLES else TEXT_SUBTITLE_CODECS
+    if OUTPUT_FILE_TYPE in ['mp4', 'm4v', 'mov']:
+        return [(position, 'mov_text') for position, stream in get_subtitle_streams(file_info['probe_result'], text_subtitle_codecs)]
+    if OUTPUT_FILE_TYPE == 'mkv':
+        return [
+            (position, 'srt' if stream.get('codec_name') == 'mov_text' else 'copy')
+            for position, stream in get_subtitle_streams(file_info['probe_result'], text_subtitle_codecs + IMAGE_SUBTITLE_CODECS)
+        ]
+    return []
 
 
 def transcoding_is_necessary(file_info):
@@ -192,6 +707,8 @@ def transcoding_is_necessary(file_info):
         file_type: type of the input file
         output_video_option: video codec transcoding option
         output_audio_option: audio codec transcoding option
+        add_stereo_audio: whether a stereo track needs to be added
+        subtitles: text subtitles which need to be extracted
 
     Returns
     -------
@@ -202,6 +719,8 @@ def transcoding_is_necessary(file_info):
     if (
         file_info['output_video_option'] == 'copy' and
         file_info['output_audio_option'] == 'copy' and
+        not file_info['add_stereo_audio'] and
+        not file_info['subtitles'] and
         file_info['file_type'] in ALLOWED_OUTPUT_FILE_TYPES
     ):
         print(f" {Fore.GREEN}File doesn't need to be transcoded{Fore.RESET}")
@@ -215,7 +734,7 @@ def get_output_file(directory_path, file_name):
     Determine the output file path, name, and type. Type is set
     by a static variable, path depends on if transcoding in place is enabled,
     name also depends on that as well as whether a file already exists
-    with the given path/name/type combination.
+    (or is reserved for a planned file) with the given path/name/type combination.
 
     Parameters
     ----------
@@ -241,7 +760,7 @@ def get_output_file(directory_path, file_name):
         output_file = f'{OUTPUT_DIRECTORY}/{file_name}.{OUTPUT_FILE_TYPE}'
 
         counter = 1
-        while os.path.isfile(output_file):
+        while os.path.isfile(output_file) or output_file in reserved_output_files:
             output_file = f'{OUTPUT_DIRECTORY}/{file_name}-{counter}.{OUTPUT_FILE_TYPE}'
             counter += 1
     return output_file
@@ -250,33 +769,734 @@ def get_output_file(directory_path, file_name):
 def get_codec_options(file_info):
     """Get codec options to use for transcoding a given file
 
-    Determine what video and audio codec options to use for transcoding
-    a given file. An option will either be the name of the codec, set in
-    a static variable, or 'copy' if the file already uses that codec.
+    Determine what video and audio codec options to use for transcoding
+    a given file. An option will either be the name of the codec, set in
+    a static variable, or 'copy' if the file already uses that codec.
+    Video which exceeds the selected bitrate profile is never copied.
+    If a stereo track is being added, surround audio in one of
+    STEREO_SURROUND_COPY_CODECS is copied alongside it.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        input_path: full path of the input file, including file name and type
+        probe_result: result of probe_file for the input file
+        input_video: video codec of the input video
+        input_audio: audio codec of the input video
+        add_stereo_audio: whether a stereo track needs to be added
+
+    Returns
+    -------
+    string
+        a string which dictates the video codec transcoding option
+    string
+        a string which dictates the audio codec transcoding option
+    """
+
+    if not DISCOVERY_MODE:
+        print(f" {Fore.GREEN}File {Fore.CYAN}{file_info['input_path']}{Fore.GREEN} has {Fore.YELLOW}{file_info['input_video']}{Fore.GREEN} video and {Fore.YELLOW}{file_info['input_audio']}{Fore.GREEN} audio{Fore.RESET}")
+
+    video_can_be_copied = file_info['input_video'] in ALLOWED_OUTPUT_VIDEO_CODECS and not get_bitrate_ceiling_issues(file_info)
+    output_video_option = 'copy' if video_can_be_copied else OUTPUT_VIDEO_CODEC
+    audio_can_be_copied = file_info['input_audio'] in ALLOWED_OUTPUT_AUDIO_CODECS or (
+        file_info['add_stereo_audio'] and file_info['input_audio'] in STEREO_SURROUND_COPY_CODECS
+    )
+    output_audio_option = 'copy' if audio_can_be_copied else OUTPUT_AUDIO_CODEC
+
+    return output_video_option, output_audio_option
+
+
+def get_video_options(file_info):
+    """Get extra ffmpeg options to use when encoding a given file's video
+
+    If a bitrate profile is selected and the video is being encoded,
+    encode with a capped CRF: constant quality, limited by the profile's
+    maximum bitrate and buffer size, and scaled down to the profile's
+    maximum height if the video is taller.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+        output_video_option: video codec transcoding option
+
+    Returns
+    -------
+    dict
+        ffmpeg output options, e.g. {'crf': 23, 'maxrate': '6500k', 'bufsize': '13000k'}
+    """
+
+    if file_info['output_video_option'] == 'copy' or not BITRATE_PROFILE:
+        return {}
+    profile = BITRATE_PROFILES[BITRATE_PROFILE]
+
+    video_options = {
+        'crf': CAPPED_CRF,
+        'maxrate': f"{profile['max_video_bitrate']}k",
+        'bufsize': f"{profile['video_buffer_size']}k"
+    }
+    video_height = (get_video_stream(file_info['probe_result']) or {}).get('height')
+    if profile.get('max_height') and video_height and video_height > profile['max_height']:
+        # -2 keeps the aspect ratio while keeping the width divisible by 2
+        video_options['vf'] = f"scale=-2:{profile['max_height']}"
+    return video_options
+
+
+def get_expected_stream_counts(file_info):
+    """Get the number of streams an output file should contain
+
+    An output should contain one video and one audio stream
+    for each that its input has, plus an audio stream for an added
+    stereo track, and each subtitle stream kept by get_kept_subtitles.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+        add_stereo_audio (optional): whether a stereo track is added
+
+    Returns
+    -------
+    dict
+        expected number of streams keyed by codec type
+    """
+
+    input_stream_counts = get_stream_counts(file_info['probe_result'])
+    expected_stream_counts = {
+        codec_type: min(input_stream_counts.get(codec_type, 0), 1)
+        for codec_type in ['video', 'audio']
+    }
+    if file_info.get('add_stereo_audio'):
+        expected_stream_counts['audio'] += 1
+    expected_stream_counts['subtitle'] = len(get_kept_subtitles(file_info))
+    return expected_stream_counts
+
+
+def apply_video_filter(stream, video_filter):
+    """Apply a video filter given as an ffmpeg -vf string to a stream
+
+    Parameters
+    ----------
+    stream : ffmpeg stream
+        video stream to filter
+    video_filter : string
+        a single filter as it would be passed to -vf, e.g. 'scale=-2:1080'
+
+    Returns
+    -------
+    ffmpeg stream
+        the filtered video stream
+    """
+
+    filter_name, _, filter_arguments = video_filter.partition('=')
+    return stream.filter(filter_name, *filter_arguments.split(':') if filter_arguments else [])
+
+
+def get_renditions(file_info):
+    """Get the renditions to make alongside a given file's transcode
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+
+    Returns
+    -------
+    list
+        specs from RENDITION_SPECS of the selected renditions which are
+        smaller than the file's own resolution
+    """
+
+    video_height = (get_video_stream(file_info['probe_result']) or {}).get('height')
+    return [
+        RENDITION_SPECS[rendition]
+        for rendition in RENDITIONS
+        if not video_height or RENDITION_SPECS[rendition]['height'] < video_height
+    ]
+
+
+def score_clip(input_path, start_seconds, sample_index, crf, video_options, clip_directory):
+    """Encode a sampled clip at a given CRF and score it against the source
+
+    Parameters
+    ----------
+    input_path : string
+        full path of the input file, including file name and type
+    start_seconds : number
+        where in the input file the clip starts
+    sample_index : int
+        position of the clip among the file's samples, used to name the encoded clip
+    crf : int
+        CRF to encode the clip with
+    video_options : dict
+        other ffmpeg options the file's video will be encoded with
+    clip_directory : string
+        directory in which to save the encoded clip
+
+    Returns
+    -------
+    float
+        the clip's SSIM or PSNR score, depending on CRF_SEARCH_METRIC,
+        or None if encoding or scoring failed
+    """
+
+    clip_file = f'{clip_directory}/{crf}-{sample_index}.mkv'
+    clip = ffmpeg.input(input_path, ss=start_seconds, t=CRF_SEARCH_SAMPLE_SECONDS)
+    clip = ffmpeg.output(clip.video, clip_file, vcodec=OUTPUT_VIDEO_CODEC, loglevel='error', **{**video_options, 'crf': crf})
+    reference = ffmpeg.input(input_path, ss=start_seconds, t=CRF_SEARCH_SAMPLE_SECONDS).video
+    if 'vf' in video_options:
+        # score against the source scaled the same way as the clip
+        reference = apply_video_filter(reference, video_options['vf'])
+    score = ffmpeg.filter([ffmpeg.input(clip_file).video, reference], CRF_SEARCH_METRIC)
+    score = ffmpeg.output(score, '-', f='null', loglevel='info')
+    try:
+        ffmpeg.run(clip, capture_stdout=True, capture_stderr=True, overwrite_output=True)
+        _, score_output = ffmpeg.run(score, capture_stdout=True, capture_stderr=True)
+    except (ffmpeg.Error):
+        return None
+
+    # e.g. 'SSIM Y:0.99 (20.1) U:0.99 (21.3) V:0.99 (21.0) All:0.991 (20.5)'
+    # or 'PSNR y:42.1 u:44.3 v:44.0 average:42.8 min:38.2 max:49.9'
+    score_pattern = r'All:([\d.]+)' if CRF_SEARCH_METRIC == 'ssim' else r'average:([\d.]+|inf)'
+    score_match = re.search(score_pattern, score_output.decode(errors='ignore'))
+    return float(score_match.group(1)) if score_match else None
+
+
+def get_crf_search_key(file_info):
+    """Get a key describing the settings a file's CRF search ran with
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        video_options: extra ffmpeg options for encoding video
+
+    Returns
+    -------
+    string
+        settings which would change the search's result if they changed
+    """
+
+    video_options = {key: value for key, value in file_info['video_options'].items() if key != 'crf'}
+    return json.dumps([
+        OUTPUT_VIDEO_CODEC, CRF_SEARCH_VALUES, CRF_SEARCH_METRIC, CRF_SEARCH_QUALITY_FLOOR,
+        CRF_SEARCH_SAMPLE_COUNT, CRF_SEARCH_SAMPLE_SECONDS, video_options
+    ], sort_keys=True)
+
+
+def search_crf(file_info):
+    """Find the highest CRF at which a file's video meets the quality floor
+
+    Encode a few short clips sampled across the file at each CRF
+    in CRF_SEARCH_VALUES, in parallel, and score each against the source.
+    Return the highest CRF whose clips all score at least
+    CRF_SEARCH_QUALITY_FLOOR, or the lowest CRF if none do.
+    Results are cached in CRF_SEARCH_CACHE_FILE by input path,
+    and reused while the file and search settings are unchanged.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        input_path: full path of the input file, including file name and type
+        probe_result: result of probe_file for the input file
+        video_options: extra ffmpeg options for encoding video
+
+    Returns
+    -------
+    int
+        CRF to encode the file's video with,
+        or None if the file's duration is unknown and no search was run
+    """
+
+    global crf_search_cache
+
+    if crf_search_cache is None:
+        crf_search_cache = read_json_file(CRF_SEARCH_CACHE_FILE)
+
+    fingerprint = get_fingerprint(file_info['input_path'])
+    search_key = get_crf_search_key(file_info)
+    cached_result = crf_search_cache.get(file_info['input_path'])
+    if cached_result and cached_result['fingerprint'] == fingerprint and cached_result['search_key'] == search_key:
+        print(f" {Fore.GREEN}Using cached CRF {Fore.YELLOW}{cached_result['crf']}{Fore.RESET}")
+        return cached_result['crf']
+
+    duration = get_duration(file_info['probe_result'])
+    if not duration:
+        print(f" {Fore.YELLOW}Duration is unknown, skipping CRF search{Fore.RESET}")
+        return None
+    sample_starts = get_sample_starts(duration, CRF_SEARCH_SAMPLE_COUNT, CRF_SEARCH_SAMPLE_SECONDS)
+    crf_values = sorted(CRF_SEARCH_VALUES)
+    print(f" {Fore.GREEN}Searching for the best CRF out of {Fore.YELLOW}{crf_values}{Fore.RESET}")
+
+    clip_directory = tempfile.mkdtemp(prefix='crf-search-')
+    try:
+        with ThreadPoolExecutor(max_workers=CRF_SEARCH_WORKERS) as executor:
+            score_futures = {
+                crf: [
+                    executor.submit(score_clip, file_info['input_path'], start, sample_index, crf, file_info['video_options'], clip_directory)
+                    for sample_index, start in enumerate(sample_starts)
+                ]
+                for crf in crf_values
+            }
+            scores = {crf: [future.result() for future in futures] for crf, futures in score_futures.items()}
+    finally:
+        shutil.rmtree(clip_directory, ignore_errors=True)
+
+    chosen_crf = crf_values[0]
+    for crf in crf_values:
+        if scores[crf] and None not in scores[crf] and min(scores[crf]) >= CRF_SEARCH_QUALITY_FLOOR:
+            chosen_crf = crf
+    print(f" {Fore.GREEN}Chose CRF {Fore.YELLOW}{chosen_crf}{Fore.RESET}")
+
+    crf_search_cache[file_info['input_path']] = {
+        'fingerprint': fingerprint,
+        'search_key': search_key,
+        'crf': chosen_crf,
+        'scores': scores
+    }
+    with open(CRF_SEARCH_CACHE_FILE, 'w') as cache_file:
+        json.dump(crf_search_cache, cache_file, indent=2)
+    return chosen_crf
+
+
+def decode_sample(output_file, start_seconds):
+    """Decode a short window of a file, discarding the result
+
+    Parameters
+    ----------
+    output_file : string
+        path of the file to decode
+    start_seconds : number
+        where in the file the decoded window starts
+
+    Returns
+    -------
+    bool
+        a boolean describing if the window decoded without errors
+    """
+
+    stream = ffmpeg.input(output_file, ss=start_seconds, t=VERIFY_SAMPLE_SECONDS)
+    stream = ffmpeg.output(stream, '-', f='null', loglevel='error')
+    try:
+        _, error_output = ffmpeg.run(stream, capture_stdout=True, capture_stderr=True)
+    except (ffmpeg.Error):
+        return False
+    # with a log level of error, anything written to stderr is a decoding error
+    return not error_output.strip()
+
+
+def get_sample_starts(duration, sample_count, sample_seconds):
+    """Get start times of sampled windows spread evenly across a file
+
+    Parameters
+    ----------
+    duration : number
+        duration of the file in seconds
+    sample_count : int
+        number of windows to sample
+    sample_seconds : number
+        length of each window in seconds
+
+    Returns
+    -------
+    list
+        start time of each window in seconds
+    """
+
+    latest_start = max(duration - sample_seconds, 0)
+    return [
+        min(max(duration * (index + 1) / (sample_count + 1) - sample_seconds / 2, 0), latest_start)
+        for index in range(sample_count)
+    ]
+
+
+def verify_output(file_info, output_file, expected_stream_counts=None):
+    """Check that a transcoded output file is complete and decodable
+
+    Probe the output file and compare its duration and stream counts
+    with the input's, then decode a few short windows spread across
+    the file in parallel. This is much cheaper than decoding the whole file,
+    but still catches truncated outputs, e.g. from a full disk.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+    output_file : string
+        path of the transcoded output file
+    expected_stream_counts : dict (optional)
+        expected number of streams keyed by codec type,
+        defaulting to the result of get_expected_stream_counts
+
+    Returns
+    -------
+    bool
+        a boolean describing if the output file passed verification
+    """
+
+    output_probe_result = probe_file(output_file)
+    if not output_probe_result:
+        print(f" {Fore.RED}Output {Fore.CYAN}{output_file}{Fore.RED} could not be probed{Fore.RESET}")
+        return False
+
+    input_duration = get_duration(file_info['probe_result'])
+    output_duration = get_duration(output_probe_result)
+    if output_duration is None or (
+        input_duration is not None and
+        abs(input_duration - output_duration) > VERIFY_DURATION_TOLERANCE
+    ):
+        print(f" {Fore.RED}Output {Fore.CYAN}{output_file}{Fore.RED} is {Fore.YELLOW}{output_duration}{Fore.RED} seconds long, but input is {Fore.YELLOW}{input_duration}{Fore.RED} seconds long{Fore.RESET}")
+        return False
+
+    output_stream_counts = get_stream_counts(output_probe_result)
+    for codec_type, expected_count in (expected_stream_counts or get_expected_stream_counts(file_info)).items():
+        if output_stream_counts.get(codec_type, 0) < expected_count:
+            print(f" {Fore.RED}Output {Fore.CYAN}{output_file}{Fore.RED} has {Fore.YELLOW}{output_stream_counts.get(codec_type, 0)}{Fore.RED} {codec_type} stream{plurality_check(output_stream_counts.get(codec_type, 0))}, expected {Fore.YELLOW}{expected_count}{Fore.RESET}")
+            return False
+
+    sample_starts = get_sample_starts(output_duration, VERIFY_SAMPLE_COUNT, VERIFY_SAMPLE_SECONDS)
+    if sample_starts:
+        with ThreadPoolExecutor(max_workers=len(sample_starts)) as executor:
+            sample_results = list(executor.map(lambda start: decode_sample(output_file, start), sample_starts))
+        if not all(sample_results):
+            print(f" {Fore.RED}Output {Fore.CYAN}{output_file}{Fore.RED} failed to decode{Fore.RESET}")
+            return False
+
+    print(f" {Fore.GREEN}Output verified{Fore.RESET}")
+    return True
+
+
+def get_thumbnail_stream(video_stream):
+    """Turn a decoded video stream into a stream of seek preview thumbnails
+
+    Parameters
+    ----------
+    video_stream : ffmpeg stream
+        decoded video stream
+
+    Returns
+    -------
+    ffmpeg stream
+        one frame every THUMBNAIL_INTERVAL seconds, scaled to THUMBNAIL_WIDTH
+    """
+
+    video_stream = video_stream.filter('fps', fps=f'1/{THUMBNAIL_INTERVAL}')
+    return video_stream.filter('scale', THUMBNAIL_WIDTH, -2)
+
+
+def get_thumbnail_output(thumbnail_stream, thumbnail_directory):
+    """Get an ffmpeg output saving thumbnails as numbered JPEGs
+
+    Parameters
+    ----------
+    thumbnail_stream : ffmpeg stream
+        result of get_thumbnail_stream
+    thumbnail_directory : string
+        directory in which to save the thumbnails
+
+    Returns
+    -------
+    ffmpeg stream
+        the output stream
+    """
+
+    return ffmpeg.output(thumbnail_stream, f'{thumbnail_directory}/%06d.jpg', vsync='cfr', **{'q:v': 5})
+
+
+def extract_keyframe_thumbnails(input_path, thumbnail_directory):
+    """Extract seek preview thumbnails by decoding only keyframes
+
+    This is much lighter than a full decode, so it's used when video is copied
+    and there is no decode to share with the transcode.
+
+    Parameters
+    ----------
+    input_path : string
+        full path of the input file, including file name and type
+    thumbnail_directory : string
+        directory in which to save the thumbnails
+
+    Returns
+    -------
+    bool
+        a boolean describing if the thumbnails were extracted successfully
+    """
+
+    video_stream = ffmpeg.input(input_path, skip_frame='nokey').video
+    stream = get_thumbnail_output(get_thumbnail_stream(video_stream), thumbnail_directory)
+    try:
+        ffmpeg.run(stream.global_args('-loglevel', FFMPEG_LOG_LEVEL), capture_stdout=True, capture_stderr=True)
+    except (ffmpeg.Error):
+        return False
+    return True
+
+
+def write_bif(thumbnail_directory, bif_path):
+    """Bundle numbered JPEG thumbnails into a BIF index
+
+    The BIF format is a 64 byte header, a table of (timestamp, offset) pairs
+    ended by a 0xffffffff timestamp and the end offset, then the images.
+
+    Parameters
+    ----------
+    thumbnail_directory : string
+        directory containing thumbnails named in order, e.g. 000001.jpg
+    bif_path : string
+        path of the BIF file to write
+    """
+
+    image_names = sorted(name for name in os.listdir(thumbnail_directory) if name.endswith('.jpg'))
+    images = []
+    for image_name in image_names:
+        with open(f'{thumbnail_directory}/{image_name}', 'rb') as image_file:
+            images.append(image_file.read())
+
+    # magic number, version, image count, and timestamp multiplier in milliseconds
+    header = b'\x89BIF\r\n\x1a\n' + struct.pack('<III', 0, len(images), 1000)
+    header += b'\x00' * (64 - len(header))
+
+    index = b''
+    offset = len(header) + 8 * (len(images) + 1)
+    for image_number, image in enumerate(images):
+        index += struct.pack('<II', image_number * THUMBNAIL_INTERVAL, offset)
+        offset += len(image)
+    index += struct.pack('<II', 0xffffffff, offset)
+
+    with open(bif_path, 'wb') as bif_file:
+        bif_file.write(header + index + b''.join(images))
+
+
+def get_settings_key(file_info):
+    """Get a key describing the settings a file would be transcoded with
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        output_video_option: video codec transcoding option
+        output_audio_option: audio codec transcoding option
+        video_options: extra ffmpeg options for encoding video, before any CRF search
+        renditions: specs of renditions made alongside the transcode
+        add_stereo_audio: whether a stereo track is added
+
+    Returns
+    -------
+    string
+        settings which would change the output (or its sidecar files) if they changed
+    """
+
+    return json.dumps([
+        file_info['output_video_option'], file_info['output_audio_option'], OUTPUT_FILE_TYPE,
+        file_info['video_options'], CRF_SEARCH and get_crf_search_key(file_info), file_info['renditions'],
+        file_info['add_stereo_audio'], EXTRACT_SUBTITLES, GENERATE_THUMBNAILS
+    ], sort_keys=True)
+
+
+def get_manifest_entry(input_path):
+    """Get the manifest's record of the last time a file was transcoded
+
+    Parameters
+    ----------
+    input_path : string
+        full path of the input file, including file name and type
+
+    Returns
+    -------
+    dict
+        the manifest entry for the file, or None if it has no entry
+        or there is no manifest
+    """
+
+    global manifest
+
+    if not MANIFEST_FILE:
+        return None
+    if manifest is None:
+        manifest = read_json_file(MANIFEST_FILE)
+    return manifest.get(input_path)
+
+
+def output_is_up_to_date(file_info):
+    """Check if a file's output from an earlier run can be reused
+
+    Like a make-style dependency check, an output is up to date if the manifest
+    has an entry for the input file, and the input file, the output file,
+    its renditions, and the transcoding settings haven't changed since it was recorded.
+    An output saved in a directory other than the current output directory
+    is never up to date.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        input_path: full path of the input file, including file name and type
+        settings_key: result of get_settings_key for the file
+
+    Returns
+    -------
+    bool
+        a boolean describing if transcoding the file again can be skipped
+    """
+
+    manifest_entry = get_manifest_entry(file_info['input_path'])
+    return bool(
+        manifest_entry and
+        manifest_entry['fingerprint'] == get_fingerprint(file_info['input_path']) and
+        is_in_output_directory(manifest_entry['output_path']) and
+        manifest_entry['output_fingerprint'] == get_fingerprint(manifest_entry['output_path']) and
+        all([
+            rendition_entry['output_fingerprint'] == get_fingerprint(rendition_entry['output_path'])
+            for rendition_entry in manifest_entry.get('renditions', {}).values()
+        ]) and
+        manifest_entry['settings_key'] == file_info['settings_key']
+    )
+
+
+def is_in_output_directory(file_path):
+    """Check if a file is directly inside the current output directory
+
+    Parameters
+    ----------
+    file_path : string
+        path of the file to check
+
+    Returns
+    -------
+    bool
+        True if the file's directory is OUTPUT_DIRECTORY
+    """
+
+    return os.path.normpath(os.path.dirname(file_path)) == os.path.normpath(OUTPUT_DIRECTORY)
+
+
+def replace_stale_output(stale_file, output_file, stale_sidecar_files=None):
+    """Replace an earlier, now out of date, output with a new one
+
+    Only earlier outputs in the current output directory are replaced;
+    outputs left in a directory which is no longer targeted are left alone.
+    The new output takes the earlier output's path if both have the same
+    file type, so players and media servers keep their reference to it,
+    and the earlier output's sidecar files keep their names. Otherwise the
+    earlier output is deleted, the new output keeps its own path, and the
+    earlier output's sidecar files are renamed to go with the new output.
+
+    Parameters
+    ----------
+    stale_file : string
+        path of the earlier output, or None if there isn't one
+    output_file : string
+        path of the new output
+    stale_sidecar_files : list (optional)
+        paths of the earlier output's sidecar files, named after it
+
+    Returns
+    -------
+    string
+        path of the new output, after replacing the earlier output
+    list
+        paths of the earlier output's sidecar files which now go with the new output
+    """
+
+    if not stale_file or not os.path.isfile(stale_file) or not is_in_output_directory(stale_file):
+        return output_file, []
+    stale_sidecar_files = [sidecar_file for sidecar_file in stale_sidecar_files or [] if os.path.isfile(sidecar_file)]
+    if stale_file == output_file:
+        return output_file, stale_sidecar_files
+    if os.path.splitext(stale_file)[1] == os.path.splitext(output_file)[1]:
+        os.replace(output_file, stale_file)
+        return stale_file, stale_sidecar_files
+
+    os.remove(stale_file)
+    stale_file_base = os.path.splitext(stale_file)[0]
+    output_file_base = os.path.splitext(output_file)[0]
+    sidecar_files = []
+    for stale_sidecar_file in stale_sidecar_files:
+        if stale_sidecar_file.startswith(stale_file_base):
+            sidecar_file = f'{output_file_base}{stale_sidecar_file[len(stale_file_base):]}'
+            os.replace(stale_sidecar_file, sidecar_file)
+            sidecar_files.append(sidecar_file)
+    return output_file, sidecar_files
+
+
+def replace_stale_outputs(file_info, output_file, rendition_files):
+    """Replace the earlier, now out of date, outputs of a file with new ones
+
+    Replaces the output and each rendition recorded in the file's manifest
+    entry (see replace_stale_output), so reruns don't pile up duplicates.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        input_path: full path of the input file, including file name and type
+        renditions (optional): specs of renditions made alongside the transcode
+    output_file : string
+        path of the transcoded output file
+    rendition_files : list
+        paths of the transcoded renditions, in the same order as their specs
+
+    Returns
+    -------
+    string
+        path of the output file, after replacing any earlier output
+    list
+        paths of the renditions, after replacing any earlier renditions
+    list
+        paths of the earlier output's sidecar files which now go with the output
+    """
+
+    stale_entry = get_manifest_entry(file_info['input_path']) or {}
+    output_file, sidecar_files = replace_stale_output(stale_entry.get('output_path'), output_file, stale_entry.get('sidecars'))
+    stale_renditions = stale_entry.get('renditions', {})
+    rendition_files = [
+        replace_stale_output(stale_renditions.get(rendition_spec['suffix'], {}).get('output_path'), rendition_file)[0]
+        for rendition_spec, rendition_file in zip(file_info.get('renditions', []), rendition_files)
+    ]
+    return output_file, rendition_files, sidecar_files
+
+
+def record_manifest_entry(file_info, output_file, rendition_files, sidecar_files):
+    """Record a transcoded file's output, renditions, sidecars, and settings in the manifest
 
     Parameters
     ----------
     file_info : dict
         Info about this file with keys:
         input_path: full path of the input file, including file name and type
-        input_video: video codec of the input video
-        input_audio: audio codec of the input video
-
-    Returns
-    -------
-    string
-        a string which dictates the video codec transcoding option
-    string
-        a string which dictates the audio codec transcoding option
+        settings_key: result of get_settings_key for the file
+        renditions (optional): specs of renditions made alongside the transcode
+    output_file : string
+        path of the transcoded output file
+    rendition_files : list
+        paths of the transcoded renditions, in the same order as their specs
+    sidecar_files : list
+        paths of the sidecar files named after the output file
     """
 
-    if not DISCOVERY_MODE:
-        print(f" {Fore.GREEN}File {Fore.CYAN}{file_info['input_path']}{Fore.GREEN} has {Fore.YELLOW}{file_info['input_video']}{Fore.GREEN} video and {Fore.YELLOW}{file_info['input_audio']}{Fore.GREEN} audio{Fore.RESET}")
-
-    output_video_option = 'copy' if file_info['input_video'] in ALLOWED_OUTPUT_VIDEO_CODECS else OUTPUT_VIDEO_CODEC
-    output_audio_option = 'copy' if file_info['input_audio'] in ALLOWED_OUTPUT_AUDIO_CODECS else OUTPUT_AUDIO_CODEC
-
-    return output_video_option, output_audio_option
+    # loads the manifest, if it hasn't been already
+    get_manifest_entry(file_info['input_path'])
+    manifest[file_info['input_path']] = {
+        'fingerprint': get_fingerprint(file_info['input_path']),
+        'output_path': output_file,
+        'output_fingerprint': get_fingerprint(output_file),
+        'renditions': {
+            rendition_spec['suffix']: {
+                'output_path': rendition_file,
+                'output_fingerprint': get_fingerprint(rendition_file)
+            }
+            for rendition_spec, rendition_file in zip(file_info.get('renditions', []), rendition_files)
+        },
+        'sidecars': sorted(set(sidecar_files)),
+        'settings_key': file_info['settings_key']
+    }
+    with open(MANIFEST_FILE, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
 
 
 def transcode_video(file_info):
@@ -286,6 +1506,13 @@ def transcode_video(file_info):
     transcoding in place, transcode directly to the output path; otherwise,
     transcode in the same directory as the input file with a temporary name,
     then delete the input file and rename the output with the input's name.
+    If output verification is on, the output is verified before the input
+    is deleted, and an output which fails verification is removed.
+    When not transcoding in place, successful outputs are recorded in the manifest.
+    If thumbnail generation is on, a BIF index of seek preview thumbnails
+    is saved next to the output, with the same name, for players and servers
+    which read sidecar BIFs. Any renditions and
+    extracted subtitles are saved next to the output too, named with their suffix.
 
     Parameters
     ----------
@@ -294,8 +1521,15 @@ def transcode_video(file_info):
         directory_path: path of the input file, excluding file name and type
         file_name: name of the input file, excluding file type
         input_path: full path of the input file, including file name and type
+        probe_result: result of probe_file for the input file
         output_video_option: video codec transcoding option
         output_audio_option: audio codec transcoding option
+        video_options: extra ffmpeg options for encoding video
+        renditions (optional): specs of renditions to make from the same decode
+        add_stereo_audio (optional): whether to add a stereo track as the default audio
+        subtitles (optional): text subtitles to extract to sidecar files
+        settings_key (optional): result of get_settings_key, recorded in the manifest
+        output_path (optional): planned output path, used if nothing exists there yet
 
     Returns
     -------
@@ -303,41 +1537,321 @@ def transcode_video(file_info):
         a boolean describing if transcoding occurred and was successful
     """
 
-    output_file = get_output_file(file_info['directory_path'], file_info['file_name'])
+    output_file = file_info.get('output_path')
+    if not output_file or os.path.isfile(output_file):
+        output_file = get_output_file(file_info['directory_path'], file_info['file_name'])
+
+    work_directory = tempfile.mkdtemp(prefix='transcode-')
+    try:
+        return run_transcode(file_info, output_file, work_directory)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+def run_transcode(file_info, output_file, work_directory):
+    """Transcode the given video, along with its renditions and sidecar files
+
+    Does the work of transcode_video once the output path is chosen.
+    The video is decoded at most once: the decoded video is split between
+    the encoder (if video is being encoded), each rendition's scaler
+    and encoder, and a low frame rate, scaled down thumbnail output.
+    If nothing else needs the decoded video, thumbnails are extracted
+    from keyframes afterwards instead. Text subtitles are converted
+    to .srt by extra outputs of the same ffmpeg run.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file, as described by transcode_video
+    output_file : string
+        path to transcode to
+    work_directory : string
+        empty temporary directory in which to save thumbnails and subtitles
+        until the output is finished
+
+    Returns
+    -------
+    bool
+        a boolean describing if transcoding occurred and was successful
+    """
+
+    thumbnail_directory = None
+    if GENERATE_THUMBNAILS:
+        thumbnail_directory = f'{work_directory}/thumbnails'
+        os.mkdir(thumbnail_directory)
+
+    input_stream = ffmpeg.input(file_info['input_path'])
+    video_options = dict(file_info.get('video_options', {}))
+    subtitles = file_info.get('subtitles', [])
+    kept_subtitles = get_kept_subtitles(file_info)
+    if EXTRACT_SUBTITLES and not kept_subtitles:
+        # text subtitles go to sidecars instead of the output, even if ffmpeg's default stream selection would keep one
+        video_options['sn'] = None
+    rendition_specs = file_info.get('renditions', [])
+    encode_video = file_info['output_video_option'] != 'copy'
+    split_thumbnails = bool(thumbnail_directory and (encode_video or rendition_specs))
+    add_stereo_audio = file_info.get('add_stereo_audio')
+    subtitle_options = {f'c:s:{index}': subtitle_codec for index, (_, subtitle_codec) in enumerate(kept_subtitles)}
+
+    if add_stereo_audio:
+        # the first audio stream twice: the surround track, then the stereo downmix as the default
+        audio_streams = [input_stream['a:0'], input_stream['a:0']]
+        audio_options = {
+            'c:a:0': file_info['output_audio_option'],
+            'c:a:1': OUTPUT_AUDIO_CODEC,
+            'ac:a:1': 2,
+            'disposition:a:0': 0,
+            'disposition:a:1': 'default'
+        }
+    else:
+        audio_streams = [input_stream['a:0']]
+        audio_options = {'acodec': file_info['output_audio_option']}
+
+    # kept subtitles are mapped explicitly too, as ffmpeg's default stream selection keeps at most one
+    if rendition_specs or split_thumbnails or add_stereo_audio or kept_subtitles:
+        video_stream = input_stream['v:0']
+        if rendition_specs or split_thumbnails:
+            # decode once, splitting the decoded video between everything which needs it
+            split_video = input_stream.video.split()
+            decoded_videos = iter([split_video[index] for index in range(encode_video + len(rendition_specs) + split_thumbnails)])
+            if encode_video:
+                video_stream = next(decoded_videos)
+                if 'vf' in video_options:
+                    video_stream = apply_video_filter(video_stream, video_options.pop('vf'))
+        output_streams = [video_stream] + audio_streams + [input_stream[f's:{position}'] for position, _ in kept_subtitles]
+    else:
+        output_streams = [input_stream]
 
-    stream = ffmpeg.input(file_info['input_path'])
     # -stats has progress show even when log level is non-verbose
-    stream = ffmpeg.output(
-        stream,
+    outputs = [ffmpeg.output(
+        *output_streams,
         output_file,
         vcodec=file_info['output_video_option'],
-        # TODO: get converting from 5.1 to stereo to work
-        # ac=2,
-        acodec=file_info['output_audio_option'],
-        loglevel=FFMPEG_LOG_LEVEL
-    ).global_args('-stats', '-n')
+        loglevel=FFMPEG_LOG_LEVEL,
+        **audio_options,
+        **subtitle_options,
+        **video_options
+    )]
+
+    rendition_files = []
+    for rendition_spec in rendition_specs:
+        rendition_file = get_output_file(file_info['directory_path'], f"{file_info['file_name']}{rendition_spec['suffix']}")
+        rendition_files.append(rendition_file)
+        outputs.append(ffmpeg.output(
+            next(decoded_videos).filter('scale', -2, rendition_spec['height']),
+            input_stream['a:0'],
+            rendition_file,
+            vcodec=OUTPUT_VIDEO_CODEC,
+            # renditions only get the stereo track, if one is being added
+            **({'acodec': OUTPUT_AUDIO_CODEC, 'ac': 2} if add_stereo_audio else {'acodec': file_info['output_audio_option']}),
+            crf=CAPPED_CRF,
+            maxrate=f"{rendition_spec['max_video_bitrate']}k",
+            bufsize=f"{rendition_spec['max_video_bitrate'] * 2}k"
+        ))
+    if split_thumbnails:
+        outputs.append(get_thumbnail_output(get_thumbnail_stream(next(decoded_videos)), thumbnail_directory))
+    for subtitle in subtitles:
+        outputs.append(ffmpeg.output(input_stream[f"s:{subtitle['position']}"], f"{work_directory}/{subtitle['position']}.srt", scodec='srt'))
+
+    stream = ffmpeg.merge_outputs(*outputs) if len(outputs) > 1 else outputs[0]
+    stream = stream.global_args('-stats', '-n')
     try:
         ffmpeg.run(stream)
     except (ffmpeg.Error):
         print(f" {Fore.RED}Exception while transcoding {Fore.CYAN}{output_file}{Fore.RED}!{Fore.RESET}\n")
 
-        # remove failed in-progress file before moving onto next file
-        os.remove(output_file)
+        # remove failed in-progress files before moving onto next file
+        for failed_file in [output_file] + rendition_files:
+            if os.path.isfile(failed_file):
+                os.remove(failed_file)
         return False
     except Exception as error:
         print(f"Non ffmpeg.Error exception occurred: {error}")
         return False
 
+    if rendition_specs:
+        rendition_stats['decodes_saved'] += len(rendition_specs)
+        rendition_stats['video_seconds_saved'] += len(rendition_specs) * (get_duration(file_info['probe_result']) or 0)
+
+    if VERIFY_OUTPUT:
+        verification_start_time = time.time()
+        output_verified = verify_output(file_info, output_file) and all([
+            verify_output(file_info, rendition_file, {'video': 1, 'audio': 1}) for rendition_file in rendition_files
+        ])
+        run_timings['verification'] += time.time() - verification_start_time
+        if not output_verified:
+            # never trust (or delete the input in favor of) an unverified output
+            for unverified_file in [output_file] + rendition_files:
+                os.remove(unverified_file)
+            return False
+
+    if thumbnail_directory and not split_thumbnails:
+        if not extract_keyframe_thumbnails(file_info['input_path'], thumbnail_directory):
+            print(f" {Fore.RED}Exception while extracting thumbnails from {Fore.CYAN}{file_info['input_path']}{Fore.RESET}")
+
+    record_manifest = bool(MANIFEST_FILE and file_info.get('settings_key'))
+    sidecar_files = []
     if IN_PLACE_TRANSCODING:
-        # delete input file and rename output file
+        # delete input file and rename output files
+        for rendition_spec, rendition_file in zip(rendition_specs, rendition_files):
+            os.replace(rendition_file, f'{file_info["directory_path"]}/{file_info["file_name"]}{rendition_spec["suffix"]}.{OUTPUT_FILE_TYPE}')
         os.remove(file_info['input_path'])
         # This could result in a file with the same name as the input
         #   but the same type as output being overwritten
-        os.rename(output_file, f'{file_info["directory_path"]}/{file_info["file_name"]}.{OUTPUT_FILE_TYPE}')
-
+        final_output_file = f'{file_info["directory_path"]}/{file_info["file_name"]}.{OUTPUT_FILE_TYPE}'
+        os.rename(output_file, final_output_file)
+        output_file = final_output_file
+    elif record_manifest:
+        output_file, rendition_files, sidecar_files = replace_stale_outputs(file_info, output_file, rendition_files)
+
+    output_file_base = os.path.splitext(output_file)[0]
+    if thumbnail_directory and os.listdir(thumbnail_directory):
+        write_bif(thumbnail_directory, f'{output_file_base}.bif')
+        sidecar_files.append(f'{output_file_base}.bif')
+    for subtitle in subtitles:
+        shutil.move(f"{work_directory}/{subtitle['position']}.srt", f"{output_file_base}{subtitle['suffix']}.srt")
+        sidecar_files.append(f"{output_file_base}{subtitle['suffix']}.srt")
+    if record_manifest and not IN_PLACE_TRANSCODING:
+        record_manifest_entry(file_info, output_file, rendition_files, sidecar_files)
+
+    queue_plex_scan(os.path.dirname(output_file))
     return True
 
 
+def send_plex_request(path, query=None):
+    """Send a GET request to the Plex server
+
+    Parameters
+    ----------
+    path : string
+        path of the endpoint, e.g. '/library/sections'
+    query : dict (optional)
+        query string parameters
+
+    Returns
+    -------
+    bytes
+        the body of the response
+    """
+
+    url = f"{PLEX_URL.rstrip('/')}{path}"
+    if query:
+        url += f'?{urllib.parse.urlencode(query)}'
+    request = urllib.request.Request(url, headers={'X-Plex-Token': PLEX_TOKEN or ''})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def get_plex_path(directory_path):
+    """Get the path the Plex server sees a local directory at
+
+    Parameters
+    ----------
+    directory_path : string
+        local path of the directory
+
+    Returns
+    -------
+    string
+        absolute path of the directory, with its prefix mapped by PLEX_PATH_MAP
+    """
+
+    plex_path = os.path.abspath(directory_path).replace('\\', '/')
+    for local_prefix, plex_prefix in PLEX_PATH_MAP.items():
+        if plex_path == local_prefix or plex_path.startswith(f"{local_prefix.rstrip('/')}/"):
+            return plex_prefix + plex_path[len(local_prefix):]
+    return plex_path
+
+
+def get_plex_library_section(plex_path):
+    """Find the Plex library section containing a path
+
+    Parameters
+    ----------
+    plex_path : string
+        path as seen by the Plex server
+
+    Returns
+    -------
+    string
+        id of the section, or None if no section contains the path
+    """
+
+    global plex_library_sections
+
+    if PLEX_LIBRARY_SECTION:
+        return PLEX_LIBRARY_SECTION
+
+    if plex_library_sections is None:
+        # e.g. <MediaContainer><Directory key="1"><Location path="/data/movies"/></Directory></MediaContainer>
+        sections_xml = ElementTree.fromstring(send_plex_request('/library/sections'))
+        plex_library_sections = [
+            (directory.get('key'), location.get('path').rstrip('/'))
+            for directory in sections_xml.iter('Directory')
+            for location in directory.iter('Location')
+        ]
+    for section, location_path in plex_library_sections:
+        if plex_path == location_path or plex_path.startswith(f'{location_path}/'):
+            return section
+    return None
+
+
+def queue_plex_scan(directory_path):
+    """Queue a directory whose contents changed to be scanned by Plex
+
+    Changed directories are collected, then scanned together once
+    PLEX_SCAN_DEBOUNCE_SECONDS have passed since the first was queued,
+    or at the end of the run.
+
+    Parameters
+    ----------
+    directory_path : string
+        local path of the changed directory
+    """
+
+    if not PLEX_URL:
+        return
+
+    plex_scan_queue['directories'].add(get_plex_path(directory_path))
+    if plex_scan_queue['queued_time'] is None:
+        plex_scan_queue['queued_time'] = time.time()
+    elif time.time() - plex_scan_queue['queued_time'] >= PLEX_SCAN_DEBOUNCE_SECONDS:
+        run_plex_scans()
+
+
+def run_plex_scans():
+    """Ask Plex to scan each queued directory
+
+    Directories inside other queued directories are skipped, since
+    Plex's partial scan of a directory includes its subdirectories.
+
+    Returns
+    -------
+    int
+        number of directories Plex was asked to scan
+    """
+
+    queued_directories = sorted(plex_scan_queue['directories'])
+    plex_scan_queue['directories'] = set()
+    plex_scan_queue['queued_time'] = None
+
+    scanned_directories = []
+    for directory in queued_directories:
+        if any(directory.startswith(f"{scanned_directory.rstrip('/')}/") for scanned_directory in scanned_directories):
+            continue
+        try:
+            section = get_plex_library_section(directory)
+            if not section:
+                print(f" {Fore.RED}No Plex library contains {Fore.CYAN}{directory}{Fore.RED}; not scanning it{Fore.RESET}")
+                continue
+            send_plex_request(f'/library/sections/{section}/refresh', {'path': directory})
+        except (Exception) as error:
+            print(f" {Fore.RED}Exception while asking Plex to scan {Fore.CYAN}{directory}{Fore.RED}: {error}{Fore.RESET}")
+            continue
+        scanned_directories.append(directory)
+    return len(scanned_directories)
+
+
 def split_file_name_type(file_name_and_type):
     """Split a file name and type combination
 
@@ -412,6 +1926,9 @@ def add_discovery_output(file_info):
         input_video: video codec of the input video
         input_audio: audio codec of the input video
         file_type: type of the input file
+        probe_result: result of probe_file for the input file
+        add_stereo_audio: whether a stereo track needs to be added
+        subtitles: text subtitles which need to be extracted
     """
 
     discovery_output = f" File {Fore.CYAN}{file_info['input_path']}{Fore.RESET}"
@@ -429,18 +1946,236 @@ def add_discovery_output(file_info):
             issues += " and"
         issues += f" is in {Fore.RED}{file_info['file_type']} format{Fore.RESET}"
         pass
+    if file_info['add_stereo_audio']:
+        if issues != "":
+            issues += " and"
+        issues += f" has {Fore.RED}no stereo {'/'.join(ALLOWED_OUTPUT_AUDIO_CODECS)} audio{Fore.RESET}"
+    if file_info['subtitles']:
+        if issues != "":
+            issues += " and"
+        issues += f" has {Fore.RED}{len(file_info['subtitles'])} embedded text subtitle{plurality_check(len(file_info['subtitles']))}{Fore.RESET}"
+    for ceiling_issue in get_bitrate_ceiling_issues(file_info):
+        if issues != "":
+            issues += " and"
+        issues += f" has {Fore.RED}{ceiling_issue}{Fore.RESET} over the {BITRATE_PROFILE} ceiling"
 
     discovery_output += issues
     discovery_mode_list.append(discovery_output)
 
 
+def add_image_subtitle_output(file_info):
+    """Appends a string about the given file's image subtitles to their list
+
+    Image subtitles can't be extracted to text sidecars, so Plex has to
+    burn them into the video when they're shown. Files which have them
+    are listed separately in the discovery report.
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        input_path: full path of the input file, including file name and type
+        probe_result: result of probe_file for the input file
+    """
+
+    image_subtitle_streams = get_subtitle_streams(file_info['probe_result'], IMAGE_SUBTITLE_CODECS)
+    if not image_subtitle_streams:
+        return
+
+    subtitle_descriptions = [
+        f"{stream['codec_name']} ({stream.get('tags', {}).get('language', 'und')})"
+        for _, stream in image_subtitle_streams
+    ]
+    image_subtitle_list.append(f" File {Fore.CYAN}{file_info['input_path']}{Fore.RESET} has {Fore.RED}{', '.join(subtitle_descriptions)}{Fore.RESET} subtitles")
+
+
+def get_fingerprint(input_path):
+    """Get a fingerprint which changes whenever the given file changes
+
+    Parameters
+    ----------
+    input_path : string
+        full path of the input file, including file name and type
+
+    Returns
+    -------
+    string
+        the file's size and modification time, e.g. '1048576:1583020800',
+        or None if the file doesn't exist
+    """
+
+    try:
+        file_stat = os.stat(input_path)
+    except (OSError):
+        return None
+    return f'{file_stat.st_size}:{int(file_stat.st_mtime)}'
+
+
+def summarize_probe(probe_result):
+    """Trim a probe result down to the details a plan needs
+
+    Parameters
+    ----------
+    probe_result : dict
+        result of probe_file for the file
+
+    Returns
+    -------
+    dict
+        probe result with only the format duration and bit rate,
+        and the stream details listed in PLAN_PROBE_STREAM_KEYS
+    """
+
+    probe_format = probe_result.get('format', {})
+    return {
+        'format': {key: probe_format[key] for key in ['duration', 'bit_rate'] if key in probe_format},
+        'streams': [
+            {key: stream[key] for key in PLAN_PROBE_STREAM_KEYS if key in stream}
+            for stream in probe_result.get('streams', [])
+        ]
+    }
+
+
+def estimate_cost(file_info):
+    """Estimate how many seconds transcoding a given file will take
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        probe_result: result of probe_file for the input file
+        output_video_option: video codec transcoding option
+        renditions: specs of renditions made alongside the transcode
+
+    Returns
+    -------
+    float
+        estimated seconds to transcode the file, or None if its duration is unknown
+    """
+
+    duration = get_duration(file_info['probe_result'])
+    if duration is None:
+        return None
+    speed = ESTIMATED_REMUX_SPEED if file_info['output_video_option'] == 'copy' else ESTIMATED_ENCODE_SPEED
+    return round(duration / speed + len(file_info['renditions']) * duration / ESTIMATED_ENCODE_SPEED, 1)
+
+
+def add_plan_entry(file_info):
+    """Appends the decisions made for the given file to the plan list
+
+    Parameters
+    ----------
+    file_info : dict
+        Info about this file with keys:
+        directory_path: path of the input file, excluding file name and type
+        file_name: name of the input file, excluding file type
+        file_type: type of the input file
+        input_path: full path of the input file, including file name and type
+        probe_result: result of probe_file for the input file
+        input_video: video codec of the input video
+        input_audio: audio codec of the input video
+        output_video_option: video codec transcoding option
+        output_audio_option: audio codec transcoding option
+        video_options: extra ffmpeg options for encoding video
+        renditions: specs of renditions made alongside the transcode
+        add_stereo_audio: whether a stereo track is added
+        subtitles: text subtitles extracted to sidecar files
+        settings_key: result of get_settings_key for the file
+    """
+
+    output_file = get_output_file(file_info['directory_path'], file_info['file_name'])
+    # inputs with the same name in different directories get different output paths
+    reserved_output_files.add(output_file)
+    plan_file_list.append({
+        'directory_path': file_info['directory_path'],
+        'file_name': file_info['file_name'],
+        'file_type': file_info['file_type'],
+        'input_path': file_info['input_path'],
+        'fingerprint': get_fingerprint(file_info['input_path']),
+        'probe_result': summarize_probe(file_info['probe_result']),
+        'input_video': file_info['input_video'],
+        'input_audio': file_info['input_audio'],
+        'output_video_option': file_info['output_video_option'],
+        'output_audio_option': file_info['output_audio_option'],
+        'video_options': file_info['video_options'],
+        'renditions': file_info['renditions'],
+        'add_stereo_audio': file_info['add_stereo_audio'],
+        'subtitles': file_info['subtitles'],
+        'settings_key': file_info['settings_key'],
+        'output_path': output_file,
+        'estimated_seconds': estimate_cost(file_info)
+    })
+
+
+def get_plan_settings():
+    """Get the settings a plan has to be applied with
+
+    These are all the settings which affect decisions made for files and
+    how they're transcoded, so a plan can be applied on another machine,
+    and files which changed since planning are checked again the same way.
+
+    Returns
+    -------
+    dict
+        settings which affect how planned files are transcoded
+    """
+
+    return {
+        'in_place_transcoding': IN_PLACE_TRANSCODING,
+        'output_directory': OUTPUT_DIRECTORY,
+        'output_file_type': OUTPUT_FILE_TYPE,
+        'verify_output': VERIFY_OUTPUT,
+        'manifest_file': MANIFEST_FILE,
+        'generate_thumbnails': GENERATE_THUMBNAILS,
+        'output_video_codec': OUTPUT_VIDEO_CODEC,
+        'allowed_output_video_codecs': ALLOWED_OUTPUT_VIDEO_CODECS,
+        'output_audio_codec': OUTPUT_AUDIO_CODEC,
+        'allowed_output_audio_codecs': ALLOWED_OUTPUT_AUDIO_CODECS,
+        'allowed_output_file_types': ALLOWED_OUTPUT_FILE_TYPES,
+        'excluded_file_types': EXCLUDED_FILE_TYPES,
+        'bitrate_profiles': BITRATE_PROFILES,
+        'bitrate_profile': BITRATE_PROFILE,
+        'capped_crf': CAPPED_CRF,
+        'crf_search': CRF_SEARCH,
+        'crf_search_values': CRF_SEARCH_VALUES,
+        'crf_search_metric': CRF_SEARCH_METRIC,
+        'crf_search_quality_floor': CRF_SEARCH_QUALITY_FLOOR,
+        'crf_search_sample_count': CRF_SEARCH_SAMPLE_COUNT,
+        'crf_search_sample_seconds': CRF_SEARCH_SAMPLE_SECONDS,
+        'rendition_specs': RENDITION_SPECS,
+        'renditions': RENDITIONS,
+        'add_stereo_audio': ADD_STEREO_AUDIO,
+        'stereo_surround_copy_codecs': STEREO_SURROUND_COPY_CODECS,
+        'extract_subtitles': EXTRACT_SUBTITLES
+    }
+
+
+def write_plan(plan_path):
+    """Write the plan list to a file
+
+    The plan is JSON with a 'settings' dict and a 'files' list with one entry
+    per file that requires transcoding. Entries can be edited or removed,
+    and a plan can be split by copying its settings alongside
+    a subset of its files.
+
+    Parameters
+    ----------
+    plan_path : string
+        path of the file to write the plan to
+    """
+
+    with open(plan_path, 'w') as plan_file:
+        json.dump({'settings': get_plan_settings(), 'files': plan_file_list}, plan_file, indent=2)
+
+
 def process_single_file(single_file, directory_path):
     """Process a single file (check codecs, possibly transcode)
 
     Access the given file, determine if it is a video and what its current
     codecs are, and then (if transcoding is necessary) store a line to be
-    printed in the report (if in discovery mode) or transcode the file to use
-    the necessary video code, audio codec, and file format.
+    printed in the report (if in discovery mode), store an entry in the plan
+    (if in plan mode), or transcode the file to use the necessary video codec,
+    audio codec, and file format.
 
     Parameters
     ----------
@@ -471,8 +2206,10 @@ def process_single_file(single_file, directory_path):
         'input_path': f'{directory_path}/{file_name}.{file_type}'
     }
 
-    input_video, input_audio = get_current_codecs(file_info['input_path'])
+    probe_result = probe_file(file_info['input_path'])
+    input_video, input_audio = get_current_codecs(probe_result)
     file_info.update({
+        'probe_result': probe_result,
         'input_video': input_video,
         'input_audio': input_audio
     })
@@ -481,23 +2218,155 @@ def process_single_file(single_file, directory_path):
         print(f" {Fore.RED}File {Fore.CYAN}{file_info['input_path']}{Fore.RED} is missing video and/or audio streams; likely not a video file{Fore.RESET}")
         return False
 
+    file_info['add_stereo_audio'] = ADD_STEREO_AUDIO and lacks_stereo_track(probe_result)
+    file_info['subtitles'] = get_text_subtitles(file_info) if EXTRACT_SUBTITLES else []
+    if DISCOVERY_MODE:
+        add_image_subtitle_output(file_info)
     output_video_option, output_audio_option = get_codec_options(file_info)
     file_info.update({
         'output_video_option': output_video_option,
         'output_audio_option': output_audio_option
     })
+    file_info['video_options'] = get_video_options(file_info)
+    file_info['renditions'] = get_renditions(file_info)
+    file_info['settings_key'] = get_settings_key(file_info)
 
     if not transcoding_is_necessary(file_info):
         return False
 
+    if MANIFEST_FILE and not IN_PLACE_TRANSCODING and not DISCOVERY_MODE and output_is_up_to_date(file_info):
+        print(f" {Fore.GREEN}Output {Fore.CYAN}{get_manifest_entry(file_info['input_path'])['output_path']}{Fore.GREEN} is up to date{Fore.RESET}")
+        return False
+
+    if CRF_SEARCH and not DISCOVERY_MODE and file_info['output_video_option'] != 'copy':
+        crf_search_start_time = time.time()
+        searched_crf = search_crf(file_info)
+        if searched_crf is not None:
+            file_info['video_options']['crf'] = searched_crf
+        run_timings['crf_search'] += time.time() - crf_search_start_time
+
+    if PLAN_FILE:
+        add_plan_entry(file_info)
     if DISCOVERY_MODE:
         add_discovery_output(file_info)
+    if PLAN_FILE or DISCOVERY_MODE:
         return False
 
     transcoding_success = transcode_video(file_info)
     return transcoding_success
 
 
+def apply_plan(plan_path):
+    """Transcode the files listed in a plan
+
+    Transcode each file in the plan at the given path using the decisions
+    stored in the plan, without re-probing it. Files which no longer exist
+    are skipped, as are files whose output from an earlier run is up to date,
+    and files whose fingerprint changed since planning are checked again
+    as if they had been found by walking the input directory.
+
+    Parameters
+    ----------
+    plan_path : string
+        path of the plan file to apply
+
+    Returns
+    -------
+    int
+        number of files checked
+    int
+        number of files transcoded successfully
+    """
+
+    global IN_PLACE_TRANSCODING
+    global OUTPUT_DIRECTORY
+    global OUTPUT_FILE_TYPE
+    global VERIFY_OUTPUT
+    global MANIFEST_FILE
+    global GENERATE_THUMBNAILS
+    global OUTPUT_VIDEO_CODEC
+    global ALLOWED_OUTPUT_VIDEO_CODECS
+    global OUTPUT_AUDIO_CODEC
+    global ALLOWED_OUTPUT_AUDIO_CODECS
+    global ALLOWED_OUTPUT_FILE_TYPES
+    global EXCLUDED_FILE_TYPES
+    global BITRATE_PROFILES
+    global BITRATE_PROFILE
+    global CAPPED_CRF
+    global CRF_SEARCH
+    global CRF_SEARCH_VALUES
+    global CRF_SEARCH_METRIC
+    global CRF_SEARCH_QUALITY_FLOOR
+    global CRF_SEARCH_SAMPLE_COUNT
+    global CRF_SEARCH_SAMPLE_SECONDS
+    global RENDITION_SPECS
+    global RENDITIONS
+    global ADD_STEREO_AUDIO
+    global STEREO_SURROUND_COPY_CODECS
+    global EXTRACT_SUBTITLES
+
+    with open(plan_path) as plan_file:
+        plan = json.load(plan_file)
+
+    settings = plan.get('settings', {})
+    IN_PLACE_TRANSCODING = settings.get('in_place_transcoding', IN_PLACE_TRANSCODING)
+    OUTPUT_DIRECTORY = settings.get('output_directory', OUTPUT_DIRECTORY)
+    OUTPUT_FILE_TYPE = settings.get('output_file_type', OUTPUT_FILE_TYPE)
+    VERIFY_OUTPUT = settings.get('verify_output', VERIFY_OUTPUT)
+    MANIFEST_FILE = settings.get('manifest_file', MANIFEST_FILE)
+    GENERATE_THUMBNAILS = settings.get('generate_thumbnails', GENERATE_THUMBNAILS)
+    OUTPUT_VIDEO_CODEC = settings.get('output_video_codec', OUTPUT_VIDEO_CODEC)
+    ALLOWED_OUTPUT_VIDEO_CODECS = settings.get('allowed_output_video_codecs', ALLOWED_OUTPUT_VIDEO_CODECS)
+    OUTPUT_AUDIO_CODEC = settings.get('output_audio_codec', OUTPUT_AUDIO_CODEC)
+    ALLOWED_OUTPUT_AUDIO_CODECS = settings.get('allowed_output_audio_codecs', ALLOWED_OUTPUT_AUDIO_CODECS)
+    ALLOWED_OUTPUT_FILE_TYPES = settings.get('allowed_output_file_types', ALLOWED_OUTPUT_FILE_TYPES)
+    EXCLUDED_FILE_TYPES = settings.get('excluded_file_types', EXCLUDED_FILE_TYPES)
+    BITRATE_PROFILES = settings.get('bitrate_profiles', BITRATE_PROFILES)
+    BITRATE_PROFILE = settings.get('bitrate_profile', BITRATE_PROFILE)
+    CAPPED_CRF = settings.get('capped_crf', CAPPED_CRF)
+    CRF_SEARCH = settings.get('crf_search', CRF_SEARCH)
+    CRF_SEARCH_VALUES = settings.get('crf_search_values', CRF_SEARCH_VALUES)
+    CRF_SEARCH_METRIC = settings.get('crf_search_metric', CRF_SEARCH_METRIC)
+    CRF_SEARCH_QUALITY_FLOOR = settings.get('crf_search_quality_floor', CRF_SEARCH_QUALITY_FLOOR)
+    CRF_SEARCH_SAMPLE_COUNT = settings.get('crf_search_sample_count', CRF_SEARCH_SAMPLE_COUNT)
+    CRF_SEARCH_SAMPLE_SECONDS = settings.get('crf_search_sample_seconds', CRF_SEARCH_SAMPLE_SECONDS)
+    RENDITION_SPECS = settings.get('rendition_specs', RENDITION_SPECS)
+    RENDITIONS = settings.get('renditions', RENDITIONS)
+    ADD_STEREO_AUDIO = settings.get('add_stereo_audio', ADD_STEREO_AUDIO)
+    STEREO_SURROUND_COPY_CODECS = settings.get('stereo_surround_copy_codecs', STEREO_SURROUND_COPY_CODECS)
+    EXTRACT_SUBTITLES = settings.get('extract_subtitles', EXTRACT_SUBTITLES)
+    if not IN_PLACE_TRANSCODING:
+        os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+    # files which can't use their planned output path don't take another file's
+    reserved_output_files.update(file_info['output_path'] for file_info in plan.get('files', []) if file_info.get('output_path'))
+
+    total_files_count = 0
+    transcoded_videos_count = 0
+    for file_info in plan.get('files', []):
+        total_files_count += 1
+        print()
+
+        fingerprint = get_fingerprint(file_info['input_path'])
+        if not fingerprint:
+            print(f" {Fore.RED}File {Fore.CYAN}{file_info['input_path']}{Fore.RED} no longer exists; skipping{Fore.RESET}")
+            continue
+
+        if fingerprint != file_info.get('fingerprint'):
+            print(f" {Fore.YELLOW}File {Fore.CYAN}{file_info['input_path']}{Fore.YELLOW} changed since planning; checking it again{Fore.RESET}")
+            file_was_transcoded = process_single_file(f"{file_info['file_name']}.{file_info['file_type']}", file_info['directory_path'])
+        else:
+            print(f" {Fore.GREEN}File {Fore.CYAN}{file_info['input_path']}{Fore.GREEN} is planned with {Fore.YELLOW}{file_info['output_video_option']}{Fore.GREEN} video and {Fore.YELLOW}{file_info['output_audio_option']}{Fore.GREEN} audio{Fore.RESET}")
+            if MANIFEST_FILE and not IN_PLACE_TRANSCODING and file_info.get('settings_key') and output_is_up_to_date(file_info):
+                print(f" {Fore.GREEN}Output {Fore.CYAN}{get_manifest_entry(file_info['input_path'])['output_path']}{Fore.GREEN} is up to date{Fore.RESET}")
+                continue
+            file_was_transcoded = transcode_video(file_info)
+
+        if file_was_transcoded:
+            transcoded_videos_count += 1
+
+    return total_files_count, transcoded_videos_count
+
+
 def complete(text, state):
     """"Completer function for directory autocomplete on macOS"""
     return (glob.glob(text+'*')+[None])[state]
@@ -654,6 +2523,11 @@ def run_wizard():
     global RECURSIVE
     global IN_PLACE_TRANSCODING
     global DISCOVERY_MODE
+    global VERIFY_OUTPUT
+    global CRF_SEARCH
+    global GENERATE_THUMBNAILS
+    global ADD_STEREO_AUDIO
+    global EXTRACT_SUBTITLES
 
     global INPUT_DIRECTORY
     global OUTPUT_DIRECTORY
@@ -669,6 +2543,11 @@ def run_wizard():
     default_recursive = RECURSIVE
     default_in_place_trancoding = IN_PLACE_TRANSCODING
     default_discovery_mode = DISCOVERY_MODE
+    default_verify_output = VERIFY_OUTPUT
+    default_crf_search = CRF_SEARCH
+    default_generate_thumbnails = GENERATE_THUMBNAILS
+    default_add_stereo_audio = ADD_STEREO_AUDIO
+    default_extract_subtitles = EXTRACT_SUBTITLES
 
     default_input_directory = INPUT_DIRECTORY
     default_output_directory = OUTPUT_DIRECTORY
@@ -704,6 +2583,36 @@ def run_wizard():
         if (IN_PLACE_TRANSCODING != default_in_place_trancoding):
             command_flag_arguments += 'p'
 
+        verify_prompt = f"{current_question}. Transcoded files can be checked for truncation or corruption by comparing them\n with their source and decoding a few short samples, before any source file is deleted.\n {Fore.CYAN}Verify transcoded files?{Fore.RESET}"
+        VERIFY_OUTPUT = await_bool_input(verify_prompt, VERIFY_OUTPUT)
+        current_question += 1
+        if (VERIFY_OUTPUT != default_verify_output):
+            command_flag_arguments += 's'
+
+        crf_search_prompt = f"{current_question}. Before encoding a file's video, a few short clips can be encoded at several quality levels\n to find the smallest output that still looks as good as its source.\n {Fore.CYAN}Search for the best quality level for each file?{Fore.RESET}"
+        CRF_SEARCH = await_bool_input(crf_search_prompt, CRF_SEARCH)
+        current_question += 1
+        if (CRF_SEARCH != default_crf_search):
+            command_flag_arguments += 'c'
+
+        thumbnails_prompt = f"{current_question}. Seek preview thumbnails can be saved in a BIF file next to each transcoded file while it's\n being transcoded, for players and servers which read them (Plex doesn't, and still generates its own).\n {Fore.CYAN}Generate seek preview thumbnails?{Fore.RESET}"
+        GENERATE_THUMBNAILS = await_bool_input(thumbnails_prompt, GENERATE_THUMBNAILS)
+        current_question += 1
+        if (GENERATE_THUMBNAILS != default_generate_thumbnails):
+            command_flag_arguments += 't'
+
+    stereo_prompt = f"{current_question}. Many browsers can't direct play surround audio. A downmixed stereo track can be added\n as the default audio for files without one, keeping the surround track.\n {Fore.CYAN}Add stereo audio tracks?{Fore.RESET}"
+    ADD_STEREO_AUDIO = await_bool_input(stereo_prompt, ADD_STEREO_AUDIO)
+    current_question += 1
+    if (ADD_STEREO_AUDIO != default_add_stereo_audio):
+        command_flag_arguments += 'm'
+
+    subtitles_prompt = f"{current_question}. Embedded text subtitles can be extracted to .srt files next to each file,\n so Plex doesn't need to transcode the video to burn them in.\n {Fore.CYAN}Extract text subtitles?{Fore.RESET}"
+    EXTRACT_SUBTITLES = await_bool_input(subtitles_prompt, EXTRACT_SUBTITLES)
+    current_question += 1
+    if (EXTRACT_SUBTITLES != default_extract_subtitles):
+        command_flag_arguments += 'x'
+
     if IN_PLACE_TRANSCODING or DISCOVERY_MODE:
         recursive_prompt = f"{current_question}. {Fore.CYAN}Run for input directory's subdirectories?{Fore.RESET}"
     else:
@@ -785,6 +2694,11 @@ def process_arguments():
     global RECURSIVE
     global IN_PLACE_TRANSCODING
     global DISCOVERY_MODE
+    global VERIFY_OUTPUT
+    global CRF_SEARCH
+    global GENERATE_THUMBNAILS
+    global ADD_STEREO_AUDIO
+    global EXTRACT_SUBTITLES
 
     global INPUT_DIRECTORY
     global OUTPUT_DIRECTORY
@@ -795,6 +2709,17 @@ def process_arguments():
     global OUTPUT_FILE_TYPE
     global ALLOWED_OUTPUT_FILE_TYPES
     global EXCLUDED_FILE_TYPES
+    global VERIFY_SAMPLE_COUNT
+    global PLAN_FILE
+    global APPLY_FILE
+    global BITRATE_PROFILE
+    global CRF_SEARCH_QUALITY_FLOOR
+    global MANIFEST_FILE
+    global RENDITIONS
+    global PLEX_URL
+    global PLEX_TOKEN
+    global PLEX_LIBRARY_SECTION
+    global FFPROBE_COMMAND
 
     parser = argparse.ArgumentParser(description='Transcode video files for use in the Plex web player', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
@@ -812,6 +2737,21 @@ def process_arguments():
     discovery_action = 'store_false' if DISCOVERY_MODE else 'store_true'
     flag_argument_group.add_argument('-d', '--discovery', action=discovery_action, help="generate report about files that need transcoding but don't transcode files")
 
+    verify_action = 'store_false' if not VERIFY_OUTPUT else 'store_true'
+    flag_argument_group.add_argument('-s', '--skipverify', action=verify_action, help="trust ffmpeg's exit code instead of verifying transcoded files before accepting them")
+
+    crf_search_action = 'store_false' if CRF_SEARCH else 'store_true'
+    flag_argument_group.add_argument('-c', '--crfsearch', action=crf_search_action, help="search sampled clips for the highest CRF meeting the quality floor before encoding each file's video")
+
+    stereo_action = 'store_false' if ADD_STEREO_AUDIO else 'store_true'
+    flag_argument_group.add_argument('-m', '--stereo', action=stereo_action, help="add a downmixed stereo track as the default audio for files without one, keeping the surround track")
+
+    subtitles_action = 'store_false' if EXTRACT_SUBTITLES else 'store_true'
+    flag_argument_group.add_argument('-x', '--subtitles', action=subtitles_action, help="extract embedded text subtitles to .srt files next to each output")
+
+    thumbnails_action = 'store_false' if GENERATE_THUMBNAILS else 'store_true'
+    flag_argument_group.add_argument('-t', '--thumbnails', action=thumbnails_action, help="save a BIF index of seek preview thumbnails next to each transcoded file, from the same decode, for players and servers which read sidecar BIFs (Plex doesn't)")
+
     value_argument_group = parser.add_argument_group('optional value arguments')
 
     value_argument_group.add_argument('-id', '--inputdirectory', default=INPUT_DIRECTORY, help="directory to check for files that need transcoding")
@@ -832,11 +2772,41 @@ def process_arguments():
 
     value_argument_group.add_argument('-eft', '--excludedfiletypes', default=EXCLUDED_FILE_TYPES, nargs='+', help="space-separated list of file types that should be automatically skipped (e.g. non video types)")
 
+    value_argument_group.add_argument('-bp', '--bitrateprofile', default=BITRATE_PROFILE, choices=list(BITRATE_PROFILES), help="transcode video exceeding this profile's bitrate / resolution ceilings so it direct plays within the bandwidth budget")
+
+    value_argument_group.add_argument('-r', '--renditions', default=RENDITIONS, nargs='+', choices=list(RENDITION_SPECS), help="space-separated list of lower resolution renditions to make from the same decode as each transcode")
+
+    value_argument_group.add_argument('-qf', '--qualityfloor', default=CRF_SEARCH_QUALITY_FLOOR, type=float, help=f"lowest acceptable {CRF_SEARCH_METRIC} score for clips sampled during CRF search")
+
+    value_argument_group.add_argument('--manifest', default=MANIFEST_FILE, help="file recording transcoded outputs, so reruns skip files whose output is up to date (pass \"\" to disable)")
+
+    value_argument_group.add_argument('--plexurl', default=PLEX_URL, help="base URL of the Plex server to ask to scan directories changed during the run, e.g. http://localhost:32400")
+
+    value_argument_group.add_argument('--plextoken', default=PLEX_TOKEN, help="X-Plex-Token used to authenticate with the Plex server")
+
+    value_argument_group.add_argument('--plexsection', default=PLEX_LIBRARY_SECTION, help="id of the Plex library section to scan changed directories in (found from library locations if not set)")
+
+    value_argument_group.add_argument('--plan', default=PLAN_FILE, help="save decisions for files that need transcoding to this plan file instead of transcoding them")
+
+    value_argument_group.add_argument('--apply', default=APPLY_FILE, help="transcode the files in this plan file instead of walking the input directory")
+
+    value_argument_group.add_argument('-fp', '--ffprobe', default=FFPROBE_COMMAND, help="command used to run ffprobe")
+
+    value_argument_group.add_argument('-vs', '--verifysamples', default=VERIFY_SAMPLE_COUNT, type=int, help="number of short windows decoded when verifying a transcoded file")
+
     args = parser.parse_args()
+    if args.plan and args.apply:
+        # applying a plan would re-plan changed files instead of transcoding them
+        parser.error("--plan and --apply can't be used together")
 
     RECURSIVE = not args.nonrecursive
     IN_PLACE_TRANSCODING = args.inplace
     DISCOVERY_MODE = args.discovery
+    VERIFY_OUTPUT = not args.skipverify
+    CRF_SEARCH = args.crfsearch
+    GENERATE_THUMBNAILS = args.thumbnails
+    ADD_STEREO_AUDIO = args.stereo
+    EXTRACT_SUBTITLES = args.subtitles
 
     INPUT_DIRECTORY = args.inputdirectory
     OUTPUT_DIRECTORY = args.outputdirectory
@@ -847,6 +2817,17 @@ def process_arguments():
     OUTPUT_FILE_TYPE = args.filetype
     ALLOWED_OUTPUT_FILE_TYPES = args.allowedfiletypes
     EXCLUDED_FILE_TYPES = args.excludedfiletypes
+    VERIFY_SAMPLE_COUNT = args.verifysamples
+    BITRATE_PROFILE = args.bitrateprofile
+    RENDITIONS = args.renditions
+    CRF_SEARCH_QUALITY_FLOOR = args.qualityfloor
+    MANIFEST_FILE = args.manifest
+    PLEX_URL = args.plexurl
+    PLEX_TOKEN = args.plextoken
+    PLEX_LIBRARY_SECTION = args.plexsection
+    FFPROBE_COMMAND = args.ffprobe
+    PLAN_FILE = args.plan
+    APPLY_FILE = args.apply
 
     if (args.wizard):
         run_wizard()
@@ -863,13 +2844,17 @@ def main():
 
     total_files_count = 0
     transcoded_videos_count = 0
-    if not IN_PLACE_TRANSCODING and not DISCOVERY_MODE:
+    if not IN_PLACE_TRANSCODING and not DISCOVERY_MODE and not PLAN_FILE and not APPLY_FILE:
         try:
             os.makedirs(OUTPUT_DIRECTORY)
         except (Exception):
             pass
 
-    directory_list = get_files()
+    if APPLY_FILE:
+        total_files_count, transcoded_videos_count = apply_plan(APPLY_FILE)
+        directory_list = []
+    else:
+        directory_list = get_files()
 
     for directory in directory_list:
         for single_file in directory['file_names']:
@@ -886,16 +2871,36 @@ def main():
 
     elapsed_time = time.time() - start_time
     print(f"\n {Fore.CYAN}Script ran for {Fore.YELLOW}{seconds_to_string(elapsed_time)}{Fore.RESET}")
-
+    if run_timings['verification'] > 0:
+        print(f" {Fore.CYAN}Verifying transcoded files took {Fore.YELLOW}{seconds_to_string(run_timings['verification'])}{Fore.RESET}")
+    if run_timings['crf_search'] > 0:
+        print(f" {Fore.CYAN}Searching for CRFs took {Fore.YELLOW}{seconds_to_string(run_timings['crf_search'])}{Fore.RESET}")
+    if rendition_stats['decodes_saved'] > 0:
+        print(f" {Fore.CYAN}Making renditions in the same pass saved {Fore.YELLOW}{rendition_stats['decodes_saved']} decode{plurality_check(rendition_stats['decodes_saved'])}{Fore.CYAN} ({Fore.YELLOW}{seconds_to_string(rendition_stats['video_seconds_saved'])}{Fore.CYAN} of video){Fore.RESET}")
+
+    if PLAN_FILE:
+        write_plan(PLAN_FILE)
+        planned_count = len(plan_file_list)
+        estimated_seconds = sum(entry['estimated_seconds'] or 0 for entry in plan_file_list)
+        print(f"\n {Fore.GREEN}Planned {Fore.YELLOW}{planned_count} file{plurality_check(planned_count)}{Fore.GREEN} for transcoding, estimated to take {Fore.YELLOW}{seconds_to_string(estimated_seconds)}{Fore.GREEN}; plan saved to {Fore.CYAN}{PLAN_FILE}{Fore.RESET}")
     if DISCOVERY_MODE:
         print(f"\n {Fore.YELLOW}{total_files_count} file{plurality_check(total_files_count)}{Fore.CYAN} checked{Fore.RESET}")
         discovered_count = len(discovery_mode_list)
         print(f"\n {Fore.GREEN}Found {Fore.YELLOW}{discovered_count} file{plurality_check(discovered_count)}{Fore.GREEN} requiring transcoding{'!' if discovered_count == 0 else ':'}{Fore.RESET}")
         for line in discovery_mode_list:
             print(line)
-    else:
+        image_subtitle_count = len(image_subtitle_list)
+        if image_subtitle_count > 0:
+            print(f"\n {Fore.GREEN}Found {Fore.YELLOW}{image_subtitle_count} file{plurality_check(image_subtitle_count)}{Fore.GREEN} with image-based subtitles, which Plex has to burn in:{Fore.RESET}")
+            for line in image_subtitle_list:
+                print(line)
+    elif not PLAN_FILE:
         print(f"\n Transcoded {Fore.YELLOW}{transcoded_videos_count} video{plurality_check(transcoded_videos_count)}{Fore.RESET}")
 
+    if plex_scan_queue['directories']:
+        scanned_count = run_plex_scans()
+        print(f"\n Asked Plex to scan {Fore.YELLOW}{scanned_count} changed director{'y' if scanned_count == 1 else 'ies'}{Fore.RESET}")
+
     # stop filtering ANSI escape sequences on windows
     deinit()
 
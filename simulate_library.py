@@ -0,0 +1,319 @@
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from colorama import deinit, Fore, init
+
+import index
+
+# stream metadata returned for simulated files, by the first pattern matching the file name;
+#   files matching no pattern are treated as unprobeable, like non-video files
+DEFAULT_SPEC = {
+    'latency_seconds': 0.0,
+    'profiles': [
+        {
+            'pattern': '*.mkv',
+            'duration': '2700.0',
+            'bit_rate': '12000000',
+            'streams': [
+                {'index': 0, 'codec_type': 'video', 'codec_name': 'hevc', 'width': 1920, 'height': 1080},
+                {'index': 1, 'codec_type': 'audio', 'codec_name': 'ac3', 'channels': 6},
+                {'index': 2, 'codec_type': 'subtitle', 'codec_name': 'subrip', 'tags': {'language': 'eng'}}
+            ]
+        },
+        {
+            'pattern': '*.mp4',
+            'duration': '1500.0',
+            'bit_rate': '4000000',
+            'streams': [
+                {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720},
+                {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'channels': 2}
+            ]
+        },
+        {
+            'pattern': '*.avi',
+            'duration': '5400.0',
+            'bit_rate': '1500000',
+            'streams': [
+                {'index': 0, 'codec_type': 'video', 'codec_name': 'mpeg4', 'width': 720, 'height': 480},
+                {'index': 1, 'codec_type': 'audio', 'codec_name': 'mp3', 'channels': 2}
+            ]
+        }
+    ]
+}
+# file types of generated placeholders, repeated in order; includes excluded types like a real library
+DEFAULT_FILE_TYPES = ['mkv', 'mkv', 'mp4', 'mp4', 'mp4', 'avi', 'srt', 'jpg']
+# placeholders per generated directory, e.g. episodes per season
+FILES_PER_DIRECTORY = 20
+# generated directories per parent directory, e.g. seasons per show
+DIRECTORIES_PER_PARENT = 10
+
+# script run in place of ffprobe when using the binary backend, matching get_probe_result;
+#   reads the spec's path from the environment, and avoids heavy imports to start quickly
+FAKE_FFPROBE_SCRIPT = '''import fnmatch
+import json
+import os
+import sys
+import time
+
+with open(os.environ['FAKE_FFPROBE_SPEC']) as spec_file:
+    spec = json.load(spec_file)
+input_path = sys.argv[-1]
+for profile in spec['profiles']:
+    if fnmatch.fnmatch(os.path.basename(input_path), profile['pattern']):
+        time.sleep(profile.get('latency_seconds', spec.get('latency_seconds', 0)))
+        print(json.dumps({
+            'format': {'filename': input_path, 'duration': profile['duration'], 'bit_rate': profile['bit_rate']},
+            'streams': profile['streams']
+        }))
+        sys.exit(0)
+time.sleep(spec.get('latency_seconds', 0))
+sys.stderr.write(input_path + ': Invalid data found when processing input\\n')
+sys.exit(1)
+'''
+
+
+def get_probe_result(spec, input_path):
+    """Get the simulated ffprobe result for a file
+
+    Waits for the spec's latency (or the matching profile's, if it has one)
+    to simulate the time ffprobe takes.
+
+    Parameters
+    ----------
+    spec : dict
+        simulation spec, shaped like DEFAULT_SPEC
+    input_path : string
+        path of the file being probed
+
+    Returns
+    -------
+    dict
+        result shaped like ffprobe's JSON output, or None if no profile matches
+    """
+
+    for profile in spec['profiles']:
+        if fnmatch.fnmatch(os.path.basename(input_path), profile['pattern']):
+            time.sleep(profile.get('latency_seconds', spec.get('latency_seconds', 0)))
+            return {
+                'format': {'filename': input_path, 'duration': profile['duration'], 'bit_rate': profile['bit_rate']},
+                'streams': profile['streams']
+            }
+    time.sleep(spec.get('latency_seconds', 0))
+    return None
+
+
+def generate_library(library_directory, file_count, file_types):
+    """Generate a tree of zero-byte placeholder files
+
+    Files are spread across nested directories, FILES_PER_DIRECTORY to a
+    directory and DIRECTORIES_PER_PARENT directories to a parent,
+    e.g. 'show-0003/season-07/file-000061.mkv'.
+
+    Parameters
+    ----------
+    library_directory : string
+        directory in which to generate the tree
+    file_count : int
+        number of placeholder files to generate
+    file_types : list
+        file types of the placeholders, repeated in order
+    """
+
+    for file_number in range(file_count):
+        directory_number = file_number // FILES_PER_DIRECTORY
+        directory_path = f'{library_directory}/show-{directory_number // DIRECTORIES_PER_PARENT:04d}/season-{directory_number % DIRECTORIES_PER_PARENT:02d}'
+        if file_number % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory_path, exist_ok=True)
+        file_type = file_types[file_number % len(file_types)]
+        open(f'{directory_path}/file-{file_number:06d}.{file_type}', 'w').close()
+
+
+def get_peak_memory():
+    """Get the peak memory use of this process
+
+    Returns
+    -------
+    int
+        peak resident set size in bytes, or None where it can't be measured (Windows)
+    """
+
+    try:
+        import resource
+    except (ImportError):
+        return None
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak_memory if sys.platform == 'darwin' else peak_memory * 1024
+
+
+def run_discovery(library_directory, spec, backend):
+    """Run the walk / probe / decide path over a library in discovery mode
+
+    Does what index.main does in discovery mode, timing it along the way.
+
+    Parameters
+    ----------
+    library_directory : string
+        directory to walk
+    spec : dict
+        simulation spec, shaped like DEFAULT_SPEC
+    backend : string
+        'inprocess' to probe by calling get_probe_result directly, or
+        'binary' to run a fake ffprobe script as a separate process for each file
+
+    Returns
+    -------
+    dict
+        measurements with keys:
+        file_count: number of files checked
+        discovered_count: number of files found to require transcoding
+        seconds: total time taken
+        first_decision_seconds: time until the first file had a decision made
+        files_per_second: throughput
+        peak_memory_bytes: peak resident set size of the process
+    """
+
+    index.INPUT_DIRECTORY = library_directory
+    index.OUTPUT_DIRECTORY = f'{library_directory}/output'
+    index.DISCOVERY_MODE = True
+    index.RECURSIVE = True
+    index.MANIFEST_FILE = None
+    index.discovery_mode_list.clear()
+    index.image_subtitle_list.clear()
+
+    work_directory = tempfile.mkdtemp(prefix='fake-ffprobe-')
+    try:
+        if backend == 'binary':
+            spec_path = f'{work_directory}/spec.json'
+            with open(spec_path, 'w') as spec_file:
+                json.dump(spec, spec_file)
+            fake_ffprobe_path = f'{work_directory}/ffprobe'
+            with open(fake_ffprobe_path, 'w') as fake_ffprobe_file:
+                fake_ffprobe_file.write(f'#!{sys.executable}\n')
+                fake_ffprobe_file.write(FAKE_FFPROBE_SCRIPT)
+            os.chmod(fake_ffprobe_path, 0o755)
+            os.environ['FAKE_FFPROBE_SPEC'] = spec_path
+            index.FFPROBE_COMMAND = fake_ffprobe_path
+            index.PROBE_BACKEND = None
+        else:
+            index.PROBE_BACKEND = lambda input_path: get_probe_result(spec, input_path)
+
+        start_time = time.time()
+        first_decision_seconds = None
+        file_count = 0
+        # discovery mode still prints a line for each file that doesn't need transcoding
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for directory in index.get_files():
+                directory_path = directory['directory_path'].replace('\\', '/')
+                for single_file in directory['file_names']:
+                    index.process_single_file(single_file, directory_path)
+                    file_count += 1
+                    if first_decision_seconds is None:
+                        first_decision_seconds = time.time() - start_time
+        elapsed_time = time.time() - start_time
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    return {
+        'file_count': file_count,
+        'discovered_count': len(index.discovery_mode_list),
+        'seconds': elapsed_time,
+        'first_decision_seconds': first_decision_seconds,
+        'files_per_second': file_count / elapsed_time if elapsed_time else None,
+        'peak_memory_bytes': get_peak_memory()
+    }
+
+
+def run_single_size(file_count, spec, backend, file_types):
+    """Generate a library of the given size and run discovery over it
+
+    Parameters
+    ----------
+    file_count : int
+        number of placeholder files to generate
+    spec : dict
+        simulation spec, shaped like DEFAULT_SPEC
+    backend : string
+        probe backend, as described by run_discovery
+    file_types : list
+        file types of the placeholders, repeated in order
+
+    Returns
+    -------
+    dict
+        measurements from run_discovery, plus generate_seconds:
+        the time taken to generate the library
+    """
+
+    library_directory = tempfile.mkdtemp(prefix='simulated-library-')
+    try:
+        generate_start_time = time.time()
+        generate_library(library_directory, file_count, file_types)
+        generate_seconds = time.time() - generate_start_time
+        result = run_discovery(library_directory, spec, backend)
+    finally:
+        shutil.rmtree(library_directory, ignore_errors=True)
+    result['generate_seconds'] = generate_seconds
+    return result
+
+
+def format_bytes(byte_count):
+    """Format a number of bytes as a human-readable string, e.g. '42.0 MB'"""
+
+    if byte_count is None:
+        return 'n/a'
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if byte_count < 1024 or unit == 'GB':
+            return f'{byte_count:.1f} {unit}'
+        byte_count /= 1024
+
+
+def main():
+    # filter ANSI escape sequences on windows
+    init()
+
+    parser = argparse.ArgumentParser(description='Measure how discovery scales by running it over simulated libraries of placeholder files', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-s', '--sizes', default=[1000, 10000, 50000], type=int, nargs='+', help="space-separated list of library sizes (number of files) to simulate")
+    parser.add_argument('-b', '--backend', default='inprocess', choices=['inprocess', 'binary'], help="probe by calling a function in-process, or by running a fake ffprobe binary for each file")
+    parser.add_argument('-l', '--latency', default=None, type=float, help="seconds each simulated probe takes, overriding the spec")
+    parser.add_argument('--spec', default=None, help="JSON file describing simulated stream metadata, shaped like DEFAULT_SPEC")
+    parser.add_argument('-ft', '--filetypes', default=DEFAULT_FILE_TYPES, nargs='+', help="space-separated list of placeholder file types, repeated in order")
+    parser.add_argument('--single', default=None, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    spec = DEFAULT_SPEC
+    if args.spec:
+        with open(args.spec) as spec_file:
+            spec = json.load(spec_file)
+    if args.latency is not None:
+        spec = dict(spec, latency_seconds=args.latency)
+
+    # each size runs in its own process, so peak memory is measured separately for each
+    if args.single:
+        print(json.dumps(run_single_size(args.single, spec, args.backend, args.filetypes)))
+        return
+
+    print(f" {Fore.CYAN}{'files':>10} {'checked/s':>12} {'first decision':>15} {'total':>10} {'peak memory':>12} {'discovered':>11}{Fore.RESET}")
+    for size in args.sizes:
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(size), '--backend', args.backend, '--filetypes', *args.filetypes]
+        if args.spec:
+            command += ['--spec', args.spec]
+        if args.latency is not None:
+            command += ['--latency', str(args.latency)]
+        result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+        print(f" {result['file_count']:>10} {result['files_per_second'] or 0:>12.1f} {result['first_decision_seconds'] or 0:>14.3f}s {result['seconds']:>9.2f}s {format_bytes(result['peak_memory_bytes']):>12} {result['discovered_count']:>11}")
+
+    # stop filtering ANSI escape sequences on windows
+    deinit()
+
+
+if __name__ == '__main__':
+    main()